@@ -1,29 +1,122 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import settings
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 from thermodynamics import Thermodynamics
-from pymatgen import MPRester, Element
+from local_calculations import LocalCalculations
+from instrumentation import RunReport, ProgressMeter
+from entry_store import EntryStore
+from result_cache import DEFAULT_LOCAL_PATH, DEFAULT_SWEEP, ResultCache, get_pymatgen_version
+from sweep_checkpoint import SweepCheckpoint
+from pymatgen.core import Element
 from pymatgen.analysis.phase_diagram import GrandPotentialPhaseDiagram, PhaseDiagram, PDPlotter
 from pymatgen.ext.matproj import MPRester
-from pymatgen.apps.borg.hive import VaspToComputedEntryDrone
-from pymatgen.apps.borg.queen import BorgQueen
 from pymatgen.entries.compatibility import MaterialsProjectCompatibility
 
+# Optional local settings module holding the Materials Project API key (apiKey).
+try:
+    import settings
+except ImportError:
+    settings = None
+
+
+# Entries and elements shared by the grand potential phase diagram workers. They are
+# set once per worker process by the pool initializer, instead of being pickled again
+# for every chemical potential interval.
+_worker_entries = None
+_worker_elements = None
+
+
+def _init_grand_potential_worker(entries, elements):
+    global _worker_entries, _worker_elements
+    _worker_entries = entries
+    _worker_elements = elements
+
+
+def _build_grand_potential_phase_diagram(open_element_and_chempot):
+    open_element, chempot = open_element_and_chempot
+    gcpd = GrandPotentialPhaseDiagram(
+        _worker_entries, {open_element: chempot}, _worker_elements)
+
+    return [entry.name for entry in gcpd.stable_entries], chempot
+
 
 class PhaseDiagramOpenAnalyzer:
     """
     Phase diagram
     """
 
-    def __init__(self, system=[], open_element=""):
+    sweeps = ("grand_potential", "facets")
+    # Compatibility scheme processing the entries. Its name keys them in the EntryCache
+    compatibility = MaterialsProjectCompatibility
+
+    def __init__(self, system=[], open_element="", sweep=DEFAULT_SWEEP, workers=None, entry_cache=None,
+                 local_path=DEFAULT_LOCAL_PATH, local_manifest=None, local_workers=1, api_key=None, report=None,
+                 verbose=False, lower_bound=None, fetcher=None, result_cache=None, slim=False, checkpoint=None,
+                 progress=None):
         """
         Phase diagram constructor
         :param system: elements of system to analyze
         :param open_element: element for potential change
+        :param sweep: how the stable phases of each chemical potential interval are found.
+            "grand_potential" builds a GrandPotentialPhaseDiagram per interval, "facets" reads
+            them from the facets of a single PhaseDiagram
+        :param workers: number of processes building the grand potential phase diagrams.
+            None or 1 builds them one after another in this process
+        :param entry_cache: EntryCache in which the Materials Project entries are looked up
+            before downloading them. None always downloads them
+        :param local_path: directory scanned for local VASP calculations. None skips the scan
+        :param local_manifest: JSON file recording the assimilated local runs, so that only the
+            ones that changed are parsed again. None parses all of them
+        :param local_workers: number of processes parsing the local runs
+        :param api_key: Materials Project API key. Defaults to settings.apiKey when a settings
+            module exists, otherwise MPRester reads it from the pymatgen configuration
+        :param report: RunReport collecting the time of each stage and the work counters.
+            None creates a new one, available as the report attribute
+        :param verbose: print the explanation of the corrections applied to the first entry
+        :param lower_bound: chemical potential of the open element closing the last interval (the phases
+            stable below the lowest transition). None leaves it open, i.e. -inf
+        :param fetcher: EntryFetcher downloading the Materials Project entries, shared by many analyzers so
+            that their downloads run concurrently and reuse connections. None downloads them with a new MPRester
+        :param result_cache: ResultCache in which the results of get_phase_diagram_data are looked up before
+            computing them. None always computes them
+        :param slim: do the hull work on PDEntry records rebuilt from an EntryStore (composition, corrected
+            energy, id) instead of on the full entries, which are then kept only for the stable phases
+            (stable_entries). Entries given as an EntryStore are always handled this way
+        :param checkpoint: file in which the stable phases of each interval are recorded as soon as they are
+            known, so that a sweep interrupted with the same entries and options resumes from it (see
+            SweepCheckpoint). None keeps no record
+        :param progress: function called as progress(done, total, intervals per second, ETA in seconds) after
+            each interval of the sweep, e.g. instrumentation.print_progress. None reports nothing
         """
+        if sweep not in self.sweeps:
+            raise ValueError("sweep must be one of {}, not '{}'".format(self.sweeps, sweep))
+
         self.system = system
         self.open_element = open_element
+        self.sweep = sweep
+        self.workers = workers
+        self.entry_cache = entry_cache
+        self.local_path = local_path
+        self.local_manifest = local_manifest
+        self.local_workers = local_workers
+        self.api_key = api_key if api_key is not None else getattr(settings, "apiKey", None)
+        self.report = report if report is not None else RunReport()
+        self.verbose = verbose
+        self.lower_bound = lower_bound
+        self.fetcher = fetcher
+        self.result_cache = result_cache
+        self.slim = slim
+        self.checkpoint = checkpoint
+        self.progress = progress
+        # Energy per atom of the open element in its ground state and entries of the phases on the hull,
+        # set by get_interval_data
+        self.reference_chempot = None
+        self.stable_entries = None
 
     @staticmethod
     def plot_phase_diagram(pd, show_unstable=False):
@@ -65,94 +158,360 @@ class PhaseDiagramOpenAnalyzer:
         # return phases, potential[0]
         return phases, potential[0]
 
-    def get_phase_diagram_data(self):
+    @staticmethod
+    def get_interval_chempots(chempots):
         """
-        Returns grand potential phase diagram data to external plot
-        Assumes openelement specific element equals None
-        :return: Data to external plot
+        Chemical potential at which the stable phases of each interval are evaluated
+        :param chempots: transition chemical potentials, in decreasing order
+        :return: midpoint of each interval; the last one is taken 0.1 eV below the last transition
         """
-        open_elements_specific = None
-        open_element_all = Element(self.open_element)
-        mpr = MPRester(settings.apiKey)
+        interval_chempots = []
+        for idx in range(len(chempots)):
+            if idx == len(chempots) - 1:
+                interval_chempots.append(chempots[idx] - 0.1)
+            else:
+                interval_chempots.append(0.5 * (chempots[idx] + chempots[idx + 1]))
+
+        return interval_chempots
+
+    def iter_grand_potential_sweep(self, entries, pd, open_element, interval_chempots):
+        """
+        Generator of the stable phases at each of the given chemical potentials, building one
+        grand potential phase diagram per chemical potential
+        :param entries: processed entries
+        :param pd: phase diagram of the entries
+        :param open_element: element to which the system is open
+        :param interval_chempots: chemical potentials of the open element (see get_interval_chempots)
+        :return: generator of (phases, chemical potential), in the order of interval_chempots
+        """
+        if self.workers is not None and self.workers > 1:
+            # executor.map keeps the order of the intervals, so the result is the same as the serial one.
+            # Each interval is yielded as soon as it and the ones before it are done
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_grand_potential_worker,
+                                     initargs=(entries, pd.elements)) as executor:
+                yield from executor.map(_build_grand_potential_phase_diagram,
+                                        [(open_element, avgchempot) for avgchempot in interval_chempots])
+            return
+
+        for avgchempot in interval_chempots:
+            gcpd = GrandPotentialPhaseDiagram(
+                entries, {open_element: avgchempot}, pd.elements)
+            yield self.get_grand_potential_phase_diagram(gcpd)
+
+    def get_grand_potential_sweep_data(self, entries, pd, open_element, chempots):
+        """
+        Stable phases of each chemical potential interval, building one grand potential
+        phase diagram per interval
+        :param entries: processed entries
+        :param pd: phase diagram of the entries
+        :param open_element: element to which the system is open
+        :param chempots: transition chemical potentials of the open element
+        :return: list of (phases, chemical potential), one per interval
+        """
+        return list(self.iter_grand_potential_sweep(entries, pd, open_element,
+                                                    self.get_interval_chempots(chempots)))
+
+    @staticmethod
+    def get_facet_chempots(pd, element):
+        """
+        Chemical potential of an element on each facet of the hull. The entries of a facet share the chemical
+        potentials of all elements, so they are the solution of sum_el x_el*mu_el = energy per atom over its
+        entries, x_el being their atomic fractions. All facets are solved at once
+        :param pd: phase diagram
+        :param element: Element
+        :return: array of chemical potentials of element, in the order of pd.facets
+        """
+        fractions = np.array([[entry.composition.get_atomic_fraction(el) for el in pd.elements]
+                              for entry in pd.qhull_entries])
+        energies = np.array([entry.energy_per_atom for entry in pd.qhull_entries])
+        facets = np.array(pd.facets)
+        chempots = np.linalg.solve(fractions[facets], energies[facets][..., None])[..., 0]
 
-        drone = VaspToComputedEntryDrone()
-        queen = BorgQueen(drone, rootpath=".")
-        entries = queen.get_data()
+        return chempots[:, pd.elements.index(element)]
+
+    @staticmethod
+    def get_stable_chempot_windows(pd, open_element):
+        """
+        Range of chemical potential of the open element in which each stable phase is stable.
+        Every facet of the hull fixes the chemical potentials of all elements, so the range of a
+        phase goes from the lowest to the highest value among the facets it belongs to. Phases
+        without the open element stay stable down to -inf, and the open element itself is left
+        out, as in GrandPotentialPhaseDiagram.
+        :param pd: phase diagram
+        :param open_element: element to which the system is open
+        :return: dict of phase name -> [highest chemical potential, lowest chemical potential]
+        """
+        windows = {}
+        for facet, chempot in zip(pd.facets, PhaseDiagramOpenAnalyzer.get_facet_chempots(pd, open_element)):
+            chempot = float(chempot)
+            for idx in facet:
+                entry = pd.qhull_entries[idx]
+                if entry.composition.elements == [open_element]:
+                    continue
+
+                window = windows.setdefault(entry.name, [chempot, chempot])
+                window[0] = max(window[0], chempot)
+                window[1] = min(window[1], chempot)
+
+                if entry.composition[open_element] == 0:
+                    window[1] = float("-inf")
+
+        return windows
+
+    def iter_facet_sweep(self, pd, open_element, interval_chempots):
+        """
+        Generator of the stable phases at each of the given chemical potentials, read from the
+        facets of a single phase diagram instead of building a new hull per chemical potential
+        :param pd: phase diagram
+        :param open_element: element to which the system is open
+        :param interval_chempots: chemical potentials of the open element (see get_interval_chempots)
+        :return: generator of (phases, chemical potential), in the order of interval_chempots
+        """
+        windows = self.get_stable_chempot_windows(pd, open_element)
+
+        for avgchempot in interval_chempots:
+            phases = [phase for phase, (max_chempot, min_chempot) in windows.items()
+                      if min_chempot < avgchempot < max_chempot]
+            yield phases, avgchempot
+
+    def get_facet_sweep_data(self, pd, open_element, chempots):
+        """
+        Stable phases of each chemical potential interval, read from the facets of a single
+        phase diagram instead of building a new hull per interval
+        :param pd: phase diagram
+        :param open_element: element to which the system is open
+        :param chempots: transition chemical potentials of the open element
+        :return: list of (phases, chemical potential), one per interval
+        """
+        return list(self.iter_facet_sweep(pd, open_element, self.get_interval_chempots(chempots)))
+
+    def get_local_entries(self):
+        """
+        Entries of the local calculations under local_path
+        :return: list of entries, empty if local_path is None
+        """
+        if self.local_path is None:
+            return []
+
+        with self.report.stage("local_calculations"):
+            local_calculations = LocalCalculations(
+                self.local_path, self.local_manifest, self.local_workers)
+            return local_calculations.get_data()
+
+    def get_entries(self, local_entries=None):
+        """
+        Returns the entries of the system, from the local calculations and the Materials Project,
+        processed with the compatibility scheme (MaterialsProjectCompatibility)
+        :param local_entries: entries of the local calculations, e.g. scanned once for many systems
+            (see get_local_entries). None scans local_path
+        :return: processed entries
+        """
+        if local_entries is None:
+            entries = self.get_local_entries()
+        else:
+            entries = list(local_entries)
+
+        compat = self.compatibility()
 
         # Get data to make phase diagram
-        mp_entries = mpr.get_entries_in_chemsys(
-            self.system, compatible_only=True)
+        def fetch():
+            with self.report.stage("mp_download"):
+                if self.fetcher is not None:
+                    return self.fetcher.get_entries(self.system)
+                mpr = MPRester(self.api_key)
+                return mpr.get_entries_in_chemsys(self.system, compatible_only=True)
+
+        if self.entry_cache is not None:
+            with self.report.stage("entry_cache"):
+                mp_entries = self.entry_cache.get_or_fetch(self.system, self.compatibility.__name__, fetch)
+        else:
+            mp_entries = fetch()
 
         entries.extend(mp_entries)
 
-        compat = MaterialsProjectCompatibility()
-        entries = compat.process_entries(entries)
+        with self.report.stage("compatibility"):
+            self.report.count("entries_processed", len(entries))
+            if self.entry_cache is not None:
+                # Corrected entries are reused as long as neither the entry nor the scheme changes
+                compatibility = "{}-{}".format(self.compatibility.__name__, get_pymatgen_version())
+                hits = self.entry_cache.correction_hits
+                entries = self.entry_cache.process_entries(entries, compatibility, compat.process_entry)
+                self.report.count("corrections_cached", self.entry_cache.correction_hits - hits)
+            else:
+                entries = compat.process_entries(entries)
         #explanation_output = open("explain.txt",'w')
         #entries_output = open("entries.txt", 'w')
-        compat.explain(entries[0])
+        if self.verbose:
+            compat.explain(entries[0])
         #print(entries, file=entries_output)
 
+        return entries
+
+    def iter_interval_data(self, entries=None):
+        """
+        Generator of the stable phases of each chemical potential interval, yielded as soon as they are
+        known, in decreasing order of chemical potential, using a single PhaseDiagram. With a checkpoint,
+        the intervals it records are yielded without computing them again, and the computed ones are added
+        to it; progress is called after each computed interval
+        :param entries: processed entries of the system, or an EntryStore of them. None gets them with get_entries
+        :return: generator of (interval index, transition chemical potential opening the interval, phases).
+            The interval ends at the transition chemical potential of the next one
+        """
+        open_elements_specific = None
+        open_element_all = Element(self.open_element)
+
+        if entries is None:
+            entries = self.get_entries()
+
+        # In slim mode the hulls are built from PDEntry records whose attribute is their index in full_entries
+        full_entries = None
+        if isinstance(entries, EntryStore):
+            entries = entries.get_pd_entries()
+        elif self.slim:
+            full_entries = entries
+            with self.report.stage("slim_entries"):
+                entries = EntryStore.from_entries(full_entries).get_pd_entries()
+
         if open_elements_specific:
             gcpd = GrandPotentialPhaseDiagram(entries, open_elements_specific)
             self.plot_phase_diagram(gcpd, False)
             self.analyze_phase_diagram(gcpd)
 
-        if open_element_all:
+        with self.report.stage("phase_diagram"):
             pd = PhaseDiagram(entries)
             chempots = pd.get_transition_chempots(open_element_all)
-            # print(chempots)
-            #all_gcpds = list()
-            toplot = []
-            # dic = {}
-            for idx in range(len(chempots)):
-                if idx == len(chempots) - 1:
-                    avgchempot = chempots[idx] - 0.1
-                else:
-                    avgchempot = 0.5 * (chempots[idx] + chempots[idx + 1])
-                gcpd = GrandPotentialPhaseDiagram(
-                    entries, {open_element_all: avgchempot}, pd.elements)
+        # Elemental ground state of the open element, the zero of voltages and of -delta mu
+        self.reference_chempot = pd.el_refs[open_element_all].energy_per_atom
+        # Only the full entries of the stable phases are kept
+        self.stable_entries = list(pd.stable_entries) if full_entries is None else \
+            [full_entries[entry.attribute] for entry in pd.stable_entries]
+        full_entries = None
+        self.report.count("hulls_built")
+        self.report.count("intervals", len(chempots))
+        # print(chempots)
 
-                # min_chempot = None if idx == len(
-                #     chempots) - 1 else chempots[idx + 1]
-                # max_chempot = chempots[idx]
-                #gcpd = GrandPotentialPhaseDiagram(entries, {open_element_all: max_chempot}, pd.elements)
+        checkpoint = None
+        done = {}
+        if self.checkpoint is not None:
+            key = ResultCache.get_result_key(entries, self.open_element,
+                                             ResultCache.get_options(self.sweep, self.lower_bound))
+            checkpoint = SweepCheckpoint(self.checkpoint, key, len(chempots))
+            done = dict(checkpoint.done)
+            self.report.count("intervals_resumed", len(done))
 
-                toplot.append(self.get_grand_potential_phase_diagram(gcpd))
-                # toplot.append(max_chempot)
+        interval_chempots = self.get_interval_chempots(chempots)
+        todo = [interval_chempots[index] for index in range(len(chempots)) if index not in done]
+        if self.sweep == "facets":
+            sweep = self.iter_facet_sweep(pd, open_element_all, todo)
+        else:
+            sweep = self.iter_grand_potential_sweep(entries, pd, open_element_all, todo)
+        meter = None if self.progress is None else ProgressMeter(len(chempots), self.progress, len(done))
 
-                #self.plot_phase_diagram(gcpd, False)
-                #print({open_element_all: max_chempot})
+        try:
+            for index, chempot in enumerate(chempots):
+                if index in done:
+                    phases = done[index]
+                else:
+                    with self.report.stage("sweep"):
+                        phases = next(sweep)[0]
+                    if self.sweep == "grand_potential":
+                        self.report.count("hulls_built")
+                    if checkpoint is not None:
+                        checkpoint.record(index, phases)
+                    if meter is not None:
+                        meter.step()
+                yield index, chempot, phases
+        finally:
+            sweep.close()
+            if checkpoint is not None:
+                checkpoint.close()
 
-        all_phase_diagrams = toplot
-        # print(all_phase_diagrams)
+    def get_interval_data(self, entries=None):
+        """
+        Returns the transition chemical potentials of the open element and the stable phases
+        between each of them, using a single PhaseDiagram
+        :param entries: processed entries of the system, or an EntryStore of them. None gets them with get_entries
+        :return: (transition chemical potentials in decreasing order, list of (phases, chemical potential),
+            one per interval below each transition)
+        """
+        chempots = []
+        phases = []
+        for index, chempot, interval_phases in self.iter_interval_data(entries):
+            chempots.append(chempot)
+            phases.append(interval_phases)
 
-        number_of_phase_diagrams = len(all_phase_diagrams)
+        return chempots, list(zip(phases, self.get_interval_chempots(chempots)))
 
-        #pd3 = PhaseDiagram(entries)
+    def get_request_key(self):
+        return ResultCache.get_analysis_request_key(self.system, self.open_element, self.sweep, self.lower_bound,
+                                                    self.local_path, self.local_manifest)
 
-        chempot_list = pd.get_transition_chempots(open_element_all)
-        pd_index = 0
+    def get_phase_diagram_data(self, entries=None):
+        """
+        Returns grand potential phase diagram data to external plot
+        Assumes openelement specific element equals None
+        :param entries: processed entries of the system. None gets them with get_entries
+        :return: dict of phase -> list of [initial chemical potential, final chemical potential] windows in
+            which the phase is stable, disjoint and in decreasing order. A phase stable in two separate
+            ranges of chemical potential has two windows. The last interval ends at lower_bound
+        """
+        if self.result_cache is None:
+            return self.build_phase_diagram_data(entries)
 
-        chempots_range_of_each_phase = {}
-        for particular_phase_diagram in all_phase_diagrams:
-            chempot = chempot_list[pd_index]
+        if isinstance(entries, EntryStore):
+            entries = entries.get_pd_entries()
 
-            if pd_index is not number_of_phase_diagrams - 1:
-                next_chempot = chempot_list[pd_index + 1]
-            else:
-                next_chempot = chempot_list[pd_index] - 2.0
-            chempot_range = [chempot, next_chempot]
+        # Without entries, a recent identical request is answered before fetching them
+        request = None
+        if entries is None:
+            request = self.get_request_key()
+            with self.report.stage("result_cache"):
+                cached = self.result_cache.get_request(request)
+            if cached is not None:
+                self.report.count("results_cached")
+                ranges, self.reference_chempot = cached
+                return ranges
+            entries = self.get_entries()
+            # The scan may have updated the manifest of the local calculations, which is part of the key
+            request = self.get_request_key()
 
-            phases_list = particular_phase_diagram[0]
+        with self.report.stage("result_cache"):
+            key = ResultCache.get_result_key(entries, self.open_element,
+                                             ResultCache.get_options(self.sweep, self.lower_bound))
+            cached = self.result_cache.get(key)
+        if cached is not None:
+            self.report.count("results_cached")
+            ranges, self.reference_chempot = cached
+        else:
+            ranges = self.build_phase_diagram_data(entries)
+            self.result_cache.put(key, ranges, self.reference_chempot)
+        if request is not None:
+            self.result_cache.put_request(request, key)
 
-            for phase in phases_list:
-                if phase in chempots_range_of_each_phase.keys():
-                    chempots_range_of_each_phase[phase][1] = next_chempot.copy(
-                    )
-                else:
-                    chempots_range_of_each_phase[phase] = chempot_range.copy()
+        return ranges
 
-            pd_index = pd_index + 1
+    def build_phase_diagram_data(self, entries=None):
+        """
+        Same as get_phase_diagram_data, always computing the result
+        """
+        lower_bound = self.lower_bound if self.lower_bound is not None else -math.inf
+
+        # Single pass over the intervals as they are computed: a phase stable in the previous interval extends
+        # its last window, otherwise a new window is opened. Windows end at lower_bound until the transition
+        # opening the next interval is known
+        chempots_range_of_each_phase = {}
+        last_interval = {}
+        previous_phases = []
+        for pd_index, chempot, phases in self.iter_interval_data(entries):
+            for phase in previous_phases:
+                chempots_range_of_each_phase[phase][-1][1] = chempot
+            for phase in phases:
+                if last_interval.get(phase) == pd_index - 1:
+                    chempots_range_of_each_phase[phase][-1][1] = lower_bound
+                else:
+                    chempots_range_of_each_phase.setdefault(phase, []).append([chempot, lower_bound])
+                last_interval[phase] = pd_index
+            previous_phases = phases
 
         return chempots_range_of_each_phase
         # print(chempots_range_of_each_phase)
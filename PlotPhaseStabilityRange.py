@@ -2,242 +2,507 @@
 ==========================
 Plot phase stability range
 ==========================
-Makes a horizontal bar plot showing the stability range of each phase in an 
+Makes a horizontal bar plot showing the stability range of each phase in an
 open chemical system as a function chemical potential, temperature or voltage.
 Created on Sat Jan  05 05:45:00 2019
 @authors: Jherfson Castro, Rodolpho Mouta
+
+Usage: python PlotPhaseStabilityRange.py --system Li-Ca-O --open-element O --output LiCaO.png
+pymatgen and matplotlib are only imported when they are needed, and this script does
+not import matplotlib at all with --no-plot. Some pymatgen modules import it on their
+own, so the non-interactive Agg backend is selected before pymatgen is loaded whenever
+nothing is going to be shown.
 """
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from thermodynamics import Thermodynamics as mu2t
-from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+from open_species import OPEN_SPECIES, find_open_species, get_open_species
+from stability_ranges import StabilityRangeTable
+from result_cache import ResultCache
+from instrumentation import RunReport, print_progress, profile
 #import PhaseAndPotential
 #from mu_to_temp import mu_to_temperature as mu2t
 
-######## Input data ########
-# Phases, initial and final chemical potential at which they are stable.
-# Bar colors, label colors. Element to which the system is open (Li, Na, O).
-#pd = PhaseAndPotential.chempot_range_of_each_phase
-element = PhaseDiagramOpenAnalyzer(system=["Li", "Ca", "O"], open_element="O")
-pd = element.get_phase_diagram_data()
-
-Phase = list(pd)
-
-mu_i = []
-mu_f = []
-for potential in pd:
-    mu_i.append(pd[potential][0])
-    mu_f.append(pd[potential][1])
-
-# print("mu_i: ",mu_i)
-
-# últim  valor do potencial e convertido para temperatura
-
-
-# LastPotential = mu_f[len(mu_f)-1]
-
-#Phase = ['SnO_2','WO_3','MnO_2','Mn_2O_3','Mn_3O_4','MnWO_4']
-#mu_i = [-4.93552791875,-4.93552791875,-4.93552791875,-5.658827941874999,-6.467741869375012,-5.886984983124987]
-#mu_f = [-8.017093547499998,-7.554040039999997,-5.658827941874999,-6.467741869375012,-7.376891950000004,-8.030107460000005]
-#BarColor = ['orchid','silver','lightblue','orange','indigo','lightgreen', 'navy', 'green', 'teal', 'darkorange','lime']
-
-BarColor = ['lightblue']*len(Phase)
-
-OpenTo = 'O'
-
-if OpenTo == 'O':
-    LastPotential = mu2t().print_temperature_corresponding_to_mu_equals(
-        mu_f[len(mu_f)-1])['T_Celsius']
-else:
-    LastPotential = mu_f[len(mu_f)-1]
-
-
 ######## Main plot parameters ########
 # Whether or not to convert the chemical potential to temperature (when open
-# to oxygen) or to voltage against Li/Li+ (when open to Li) or Na/Na+ (when
-# open to Na). The options are 'None', 'T_C', 'T_K', 'V_Li', 'V_Na'.
+# to oxygen, nitrogen or hydrogen) or to voltage against Li/Li+ (when open to Li),
+# Na/Na+ (when open to Na), etc. The options are 'None', 'T_C', 'T_K', 'V_Li',
+# 'V_Na', 'V_K', 'V_Mg' (see open_species.py).
 ConvertTo = 'T_C'
-# Range of the plotted quantity. If ConvertTo is set no 'None', the
-# quantity is the chemical potential. If it is set to 'T_C' or 'T_K', the
-# quantity is the temperature in °C or K, respectively. If it is set to
-# 'V_Li' or 'V_Na' the quantity is V vs. Li/Li+ or V vs. Na/Na+, respectively.
-Xmin, Xmax = Xlim = 0, LastPotential  # 1350
 # Bar height, ranging from 0 to 1 [the spacing between bars
 # will be (1 - BarHeight)]; phase label font.
 BarHeight = 0.7
 PhaseLabelSize = 14
-# Y axis range; minor and major ticks spacing; tick label size.
-Ymin, Ymax = Ylim = BarHeight-1, len(Phase)-0
-
+# Minor and major ticks spacing; tick label size.
 # MinorTickSpacing,MajorTickSpacing = 0.5, 2#50, 200
-
-
 MinorTickSpacing, MajorTickSpacing = 50, 200
-
 TickFontSize = 11
 # Axes labels size and their distance from borders.
 AxisFontSize = 16
-
 LabelShift = 10
 # Grid transparency in %
 Transparency = 75
-
-
-######## Processing of input data ########
 # Set Y label
 YLabel = 'Stable phases'
-# Set X axis label based on the open element and the conversion selected by the user.
-if OpenTo == 'O':
-    if ConvertTo == 'T_C':
-        XLabel = 'Temperature (°C)'
-    elif ConvertTo == 'T_K':
-        XLabel = 'Temperature (K)'
-    elif ConvertTo == 'None':
-        XLabel = r'-$\Delta$' + r'$\mu_O$ (eV)'
+# Phase labels.
+LabelProps = {'horizontalalignment': 'center', 'verticalalignment': 'center',
+              'fontsize': PhaseLabelSize, 'fontweight': 'bold'}
+
+#Phase = ['SnO_2','WO_3','MnO_2','Mn_2O_3','Mn_3O_4','MnWO_4']
+#mu_i = [-4.93552791875,-4.93552791875,-4.93552791875,-5.658827941874999,-6.467741869375012,-5.886984983124987]
+#mu_f = [-8.017093547499998,-7.554040039999997,-5.658827941874999,-6.467741869375012,-7.376891950000004,-8.030107460000005]
+#BarColor = ['orchid','silver','lightblue','orange','indigo','lightgreen', 'navy', 'green', 'teal', 'darkorange','lime']
+
+
+def get_stability_ranges(system, open_element, **analyzer_options):
+    """
+    Phases, initial and final chemical potential at which they are stable
+    :param system: elements of the system
+    :param open_element: element to which the system is open
+    :param analyzer_options: options of PhaseDiagramOpenAnalyzer. With a result_cache, a recent
+        identical request is answered from it without importing pymatgen
+    :return: StabilityRangeTable
+    """
+    label = '{}:{}'.format('-'.join(system), open_element)
+    result_cache = analyzer_options.get('result_cache')
+    if result_cache is not None:
+        request = ResultCache.get_analysis_request_key(system, open_element, **analyzer_options)
+        cached = result_cache.get_request(request)
+        if cached is not None:
+            if analyzer_options.get('report') is not None:
+                analyzer_options['report'].count('results_cached')
+            return StabilityRangeTable.from_dict(cached[0], label, cached[1])
+
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    element = PhaseDiagramOpenAnalyzer(system=system, open_element=open_element, **analyzer_options)
+    pd = element.get_phase_diagram_data()
+
+    return StabilityRangeTable.from_dict(pd, label, element.reference_chempot)
+
+
+def load_stability_ranges(path, system=None):
+    """
+    Stability ranges saved by StabilityRangeTable (a .npz file or a directory of .npy files)
+    :param path: file or directory
+    :param system: label of the system to keep, e.g. 'Li-Ca-O:O'. None keeps all rows
+    :return: StabilityRangeTable
+    """
+    if os.path.isdir(path):
+        table = StabilityRangeTable.load(path)
     else:
-        XLabel = r'$\mu_O$ (eV)'
-        ConvertTo = 'None'
-        print('!!! ERROR !!! \nSelected conversion of oxygen chemical potential not allowed. '
-              'The X axis quantity will be kept as chemical potential. '
-              "Check 'ConvertTo' variable. ")
-elif OpenTo == 'Li':
-    if ConvertTo == 'V_Li':
-        XLabel = 'V vs. Li/Li$^+$ (V)'
-    elif ConvertTo == 'None':
-        XLabel = r'$\mu_{Li}$ vs. Li° (eV)'
+        table = StabilityRangeTable.load_npz(path)
+    if system is not None and len(table.systems) > 1:
+        table = table.select(system=system)
+
+    return table
+
+
+def get_axis_label(OpenTo, ConvertTo):
+    """
+    X axis label based on the open element and the conversion selected by the user
+    :param OpenTo: element to which the system is open (see open_species.OPEN_SPECIES)
+    :param ConvertTo: 'None', 'T_C', 'T_K' or 'V_' + element, e.g. 'V_Li'
+    :return: (X label, open element, conversion), the last two corrected if they were not consistent
+    """
+    if OpenTo in OPEN_SPECIES:
+        species = OPEN_SPECIES[OpenTo]
+        if ConvertTo not in species.conversions:
+            ConvertTo = 'None'
+            print('!!! ERROR !!! \nSelected conversion of {} chemical potential not allowed. '
+                  'The X axis quantity will be kept as chemical potential. '
+                  "Check 'ConvertTo' variable. ".format(OpenTo))
     else:
-        XLabel = r'$\mu_{Li}$ vs. Li° (eV)'
-        ConvertTo = 'None'
-        print('!!! ERROR !!! \nSelected conversion of lithium chemical potential not allowed. '
-              'The X axis quantity will be kept as chemical potential. '
-              "Check 'ConvertTo' variable. ")
-elif OpenTo == 'Na':
-    if ConvertTo == 'V_Na':
-        XLabel = 'V vs. Na/Na$^+$ (V)'
-    elif ConvertTo == 'None':
-        XLabel = r'$\mu_{Na}$ vs. Na° (eV)'
+        print('!!! ERROR !!!', "\n'{}'".format(OpenTo), 'is not a valid option to '
+              "describe to which element the system is open. The only valid "
+              "options currently are {}. Ckeck 'OpenTo' variable.".format(
+                  ', '.join("'{}'".format(element) for element in OPEN_SPECIES)))
+        species = find_open_species(ConvertTo)
+        if species is None:
+            species = get_open_species(OpenTo)
+            ConvertTo = 'None'
+            print("Thus, the x axis variable will be assumed to be an arbitrary "
+                  "chemical potential.")
+        else:
+            OpenTo = species.element
+            print("However, 'ConvertTo' variable is set to", "'{}'".format(ConvertTo), 'which '
+                  'is associated to', '{}.'.format(
+                      OpenTo), " Thus, it was assumed that the "
+                  'system is in fact open to', '{},'.format(
+                      OpenTo), "so that the 'OpenTo' "
+                  "variable was overridden and set to this element.")
+
+    return species.labels[ConvertTo], OpenTo, ConvertTo
+
+
+def convert_chempots(mu_i, mu_f, OpenTo, ConvertTo, reference=None, thermodynamics=None):
+    """
+    Converts the data from chemical potential to temperature or voltage,
+    if necessary (i.e., if 'ConvertTo' is not set to 'None').
+    :param mu_i: initial chemical potentials
+    :param mu_f: final chemical potentials
+    :param OpenTo: element to which the system is open
+    :param ConvertTo: 'None', 'T_C', 'T_K' or 'V_' + element
+    :param reference: chemical potential of the elemental ground state of the open element (the
+        reference_chempot of the analyzer). Only temperatures with a given thermodynamics can be
+        converted without it; other conversions raise ValueError
+    :param thermodynamics: Thermodynamics used for the temperature conversions. None builds it from reference
+    :return: (initial X values, final X values) as arrays
+    """
+    species = get_open_species(OpenTo)
+    mu_i = np.asarray(mu_i, dtype=float)
+    mu_f = np.asarray(mu_f, dtype=float)
+
+    # Both bounds are converted at once
+    X = species.convert(np.concatenate([mu_i, mu_f]), ConvertTo, reference, thermodynamics)
+
+    return X[:len(mu_i)], X[len(mu_i):]
+
+
+def get_bar_geometry(Phase, Xi, Xf, Xlim):
+    """
+    Bars and labels of the stability range plot. A phase stable in separate windows is given
+    once per window, and all its bars are drawn on the same row
+    :param Phase: phase name of each window
+    :param Xi: initial X value of each window
+    :param Xf: final X value of each window
+    :param Xlim: (Xmin, Xmax)
+    :return: (phase labels, label colors, bar left edges, bar widths, bar centers, bar y positions)
+    """
+    Xmin, Xmax = min(Xlim), max(Xlim)
+
+    # Initialize label color. Trim initial and final X values, including
+    # open (infinite) ones, based on the X range. Also, if the bar color is too dark, change the label
+    # color to white instead of black. Put the phase labels in boldface.
+    LabelColor = ['black']*len(Phase)
+    Xi = list(Xi)
+    Xf = list(Xf)
+    Phase = list(Phase)
+    for n in range(0, len(Phase)):
+        Xi[n] = min(max(Xi[n], Xmin), Xmax)
+        Xf[n] = min(max(Xf[n], Xmin), Xmax)
+        # if BarColor[n] in ['black','Black','brown','Brown','navy','Navy','blue','Blue','green','Green', 'red', 'Red', 'green', 'Green', 'lime', 'Lime', 'indigo', 'Indigo', 'navy', 'Navy', 'darkorange', 'Darkorange']:
+            #LabelColor[n] = 'white'
+        Phase[n] = '${'+Phase[n]+'}$'
+    # Calculate range and center of X axis quantity for each phase. Generate y positions,
+    # one row per phase in order of appearance.
+    Xr = (np.array(Xf) - np.array(Xi)).tolist()
+    Xc = ((np.array(Xf) + np.array(Xi))/2).tolist()
+    rows = {}
+    BarYPos = np.array([rows.setdefault(phase, len(rows)) for phase in Phase], dtype=int)
+
+    return Phase, LabelColor, Xi, Xr, Xc, BarYPos
+
+
+def format_axes(ax, XLabel, MinorTickSpacing=MinorTickSpacing, MajorTickSpacing=MajorTickSpacing):
+    """
+    Axes labels, ticks and grid of the stability range plot
+    :param ax: matplotlib Axes
+    :param XLabel: X axis label
+    """
+    import matplotlib.pyplot as plt
+
+    # Generate axes labels.
+    ax.set_xlabel(XLabel, fontsize=AxisFontSize, labelpad=LabelShift)
+    ax.set_ylabel(YLabel, fontsize=AxisFontSize, labelpad=LabelShift)
+    # Set major and minor ticks spacing, direction, and respective label size
+    ax.xaxis.set_major_locator(plt.MultipleLocator(MajorTickSpacing))
+    ax.xaxis.set_minor_locator(plt.MultipleLocator(MinorTickSpacing))
+    ax.tick_params(axis='both', which='both', direction='in',
+                   labelsize=TickFontSize, width=0.8)
+    ax.tick_params(axis='both', which='minor', length=3)
+    ax.tick_params(axis='both', which='major', length=5)
+    ax.set_yticks([])
+    # Set vertical grid lines. Choose if they follow only major ticks,
+    # minor ticks or both. Set grid transparency.
+    ax.grid(axis='x', which='minor', alpha=1-Transparency/100)
+
+
+def plot_stability_range(Phase, Xi, Xf, XLabel, Xlim, output=None, dpi=115,
+                         MinorTickSpacing=MinorTickSpacing, MajorTickSpacing=MajorTickSpacing):
+    """
+    Horizontal bar plot of the stability range of each phase
+    :param Phase: phase name of each window (repeated for phases stable in separate windows)
+    :param Xi: initial X value of each window
+    :param Xf: final X value of each window
+    :param XLabel: X axis label
+    :param Xlim: (Xmin, Xmax)
+    :param output: image file (.png, .svg, .pdf, ...). If given, the figure is rendered with
+        the non-interactive Agg backend and saved; otherwise it is shown
+    :param dpi: resolution of the figure
+    """
+    import matplotlib
+    if output is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # Y axis range
+    Ymin, Ymax = Ylim = BarHeight-1, len(set(Phase))-0
+    BarColor = ['lightblue']*len(Phase)
+    Phase, LabelColor, Xi, Xr, Xc, BarYPos = get_bar_geometry(Phase, Xi, Xf, Xlim)
+
+    ######## Plot generation ########
+    fig, ax = plt.subplots(figsize=(6, 2), dpi=dpi)
+    # Set plot limits.
+    ax.set(xlim=Xlim, ylim=Ylim, autoscale_on=False)
+    # Generate bars.
+    ax.barh(y=BarYPos, left=Xi, width=Xr,
+            height=BarHeight, align='edge', color=BarColor)
+    # Generate phase labels.
+    for n in range(0, len(Phase)):
+        ax.text(x=Xc[n], y=BarYPos[n]+BarHeight/2,
+                s=Phase[n], color=LabelColor[n], **LabelProps)
+    format_axes(ax, XLabel, MinorTickSpacing, MajorTickSpacing)
+
+    if output is not None:
+        fig.savefig(output, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
     else:
-        XLabel = r'$\mu_{Na}$ vs. Na° (eV)'
-        ConvertTo = 'None'
-        print('!!! ERROR !!! \nSelected conversion of sodium chemical potential not allowed. '
-              'The X axis quantity will be kept as chemical potential. '
-              "Check 'ConvertTo' variable.")
-else:
-    print('!!! ERROR !!!', "\n'{}'".format(OpenTo), 'is not a valid option to '
-          "describe to which element the system is open. The only valid "
-          "options currently are 'Li', 'Na' and 'O'. Ckeck 'OpenTo' variable.")
-    if ConvertTo == 'T_C':
-        XLabel = 'Temperature (°C)'
-        OpenTo = 'O'
-    elif ConvertTo == 'T_K':
-        XLabel = 'Temperature (K)'
-        OpenTo = 'O'
-    elif ConvertTo == 'V_Na':
-        XLabel = 'V vs. Na/Na$^+$'
-        OpenTo = 'Na'
-    elif ConvertTo == 'V_Li':
-        XLabel = 'V vs. Li/Li$^+$'
-        OpenTo = 'Li'
-    elif ConvertTo == 'None':
-        XLabel = r'$\mu$' + r'$\mu$ (eV)'
+        plt.show()
+
+
+class StabilityRangeRenderer:
+    """
+    Renders many stability range plots to files reusing a single Figure and Axes. The
+    bars and phase labels of previous plots are kept, and only their geometry, text and
+    visibility are updated, so no figure, bar or text is created again for each plot.
+    """
+
+    def __init__(self, dpi=115, MinorTickSpacing=MinorTickSpacing, MajorTickSpacing=MajorTickSpacing):
+        """
+        Renderer constructor
+        :param dpi: resolution of the figures
+        """
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        self.dpi = dpi
+        self.fig, self.ax = plt.subplots(figsize=(6, 2), dpi=dpi)
+        self.ax.set_autoscale_on(False)
+        format_axes(self.ax, '', MinorTickSpacing, MajorTickSpacing)
+        self.bars = []
+        self.labels = []
+
+    def add_bars(self, number_of_bars):
+        """
+        Creates bars and labels until there are at least number_of_bars of them
+        """
+        missing = number_of_bars - len(self.bars)
+        if missing <= 0:
+            return
+
+        BarYPos = np.arange(len(self.bars), number_of_bars)
+        container = self.ax.barh(y=BarYPos, left=np.zeros(missing), width=np.zeros(missing),
+                                 height=BarHeight, align='edge', color='lightblue')
+        self.bars.extend(container.patches)
+        for y in BarYPos:
+            self.labels.append(self.ax.text(x=0.0, y=y+BarHeight/2, s='', **LabelProps))
+
+    def render(self, Phase, Xi, Xf, XLabel, Xlim, output):
+        """
+        Saves the plot of one system
+        :param Phase: phase name of each window
+        :param Xi: initial X value of each window
+        :param Xf: final X value of each window
+        :param XLabel: X axis label
+        :param Xlim: (Xmin, Xmax)
+        :param output: image file (.png, .svg, .pdf, ...)
+        :return: time spent rendering, in s
+        """
+        start = time.perf_counter()
+
+        Phase, LabelColor, Xi, Xr, Xc, BarYPos = get_bar_geometry(Phase, Xi, Xf, Xlim)
+        self.add_bars(len(Phase))
+
+        for n, (bar, label) in enumerate(zip(self.bars, self.labels)):
+            visible = n < len(Phase)
+            bar.set_visible(visible)
+            label.set_visible(visible)
+            if visible:
+                bar.set_x(Xi[n])
+                bar.set_y(BarYPos[n])
+                bar.set_width(Xr[n])
+                label.set_position((Xc[n], BarYPos[n]+BarHeight/2))
+                label.set_text(Phase[n])
+                label.set_color(LabelColor[n])
+
+        self.ax.set_xlim(Xlim)
+        self.ax.set_ylim(BarHeight-1, BarYPos.max()+1 if len(Phase) else 0)
+        self.ax.set_xlabel(XLabel, fontsize=AxisFontSize, labelpad=LabelShift)
+        self.fig.savefig(output, dpi=self.dpi, bbox_inches='tight')
+
+        return time.perf_counter() - start
+
+
+# Renderer of each worker process, created by the pool initializer.
+_worker_renderer = None
+
+
+def _init_render_worker(dpi, MinorTickSpacing, MajorTickSpacing):
+    global _worker_renderer
+    _worker_renderer = StabilityRangeRenderer(dpi, MinorTickSpacing, MajorTickSpacing)
+
+
+def _render_job(job):
+    return job[-1], _worker_renderer.render(*job)
+
+
+def render_batch(jobs, workers=None, dpi=115, MinorTickSpacing=MinorTickSpacing, MajorTickSpacing=MajorTickSpacing):
+    """
+    Renders many stability range plots to files
+    :param jobs: iterable of (Phase, Xi, Xf, XLabel, Xlim, output), as in StabilityRangeRenderer.render
+    :param workers: number of processes, each reusing its own figure. None or 1 renders in this process
+    :param dpi: resolution of the figures
+    :return: generator of (output, render time in s), in the order of the jobs
+    """
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                                 initargs=(dpi, MinorTickSpacing, MajorTickSpacing)) as executor:
+            yield from executor.map(_render_job, jobs)
     else:
-        XLabel = r'$\mu$ (eV)'
-        ConvertTo = 'None'
-    if ConvertTo == 'None':
-        print("Thus, the x axis variable will be assumed to be an arbitrary "
-              "chemical potential.")
+        renderer = StabilityRangeRenderer(dpi, MinorTickSpacing, MajorTickSpacing)
+        for job in jobs:
+            yield job[-1], renderer.render(*job)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Stability range of each phase in an open chemical system')
+    parser.add_argument('--system', default='Li-Ca-O', help="elements of the system, e.g. 'Li-Ca-O'")
+    parser.add_argument('--open-element', default='O', help='element to which the system is open')
+    parser.add_argument('--convert-to', default=ConvertTo,
+                        choices=sorted(set(c for species in OPEN_SPECIES.values() for c in species.conversions)))
+    parser.add_argument('--xmin', type=float, default=0.0)
+    parser.add_argument('--lower-bound', type=float, default=None,
+                        help='chemical potential (eV) closing the last interval; by default it is left open '
+                             'and the plot is clipped at --xmax')
+    parser.add_argument('--xmax', type=float, default=None,
+                        help='defaults to the end of the last stability range')
+    parser.add_argument('--minor-tick', type=float, default=MinorTickSpacing)
+    parser.add_argument('--major-tick', type=float, default=MajorTickSpacing)
+    parser.add_argument('--output', default=None,
+                        help='save the figure to this file (.png, .svg, .pdf) instead of showing it')
+    parser.add_argument('--dpi', type=int, default=115)
+    parser.add_argument('--no-plot', action='store_true', help='only print the data; matplotlib is not imported')
+    parser.add_argument('--sweep', default='grand_potential', choices=['grand_potential', 'facets'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--local-path', default='.', help="directory with local VASP calculations; 'none' skips them")
+    parser.add_argument('--api-key', default=None, help='Materials Project API key')
+    parser.add_argument('--slim', action='store_true',
+                        help='build the hulls from slim copies of the entries (composition, energy, id)')
+    parser.add_argument('--verbose', action='store_true', help='explain the corrections applied to the entries')
+    parser.add_argument('--shomate-table', action='store_true',
+                        help='convert temperatures with a precomputed Shomate table instead of solving for them')
+    parser.add_argument('--checkpoint', default=None,
+                        help='record the stable phases of each interval in this file, so that an interrupted '
+                             'run with the same entries and options resumes from it')
+    parser.add_argument('--progress', action='store_true',
+                        help='print the intervals done, intervals/s and the ETA of the sweep to stderr')
+    parser.add_argument('--result-cache', nargs='?', const='', default=None,
+                        help='cache the stability ranges on disk (optionally in this SQLite file), so that '
+                             'plotting the same system again does not compute them')
+    parser.add_argument('--data', default=None,
+                        help='plot stability ranges saved as .npz or .npy directory instead of computing them')
+    parser.add_argument('--save-data', default=None,
+                        help='save the stability ranges as .npz (or as a .npy directory if no .npz extension)')
+    parser.add_argument('--report', default=None,
+                        help='write the time of each stage and the work counters to this JSON file')
+    parser.add_argument('--profile', default=None, choices=['cprofile', 'pyinstrument'],
+                        help='profile the run')
+    parser.add_argument('--profile-output', default='PlotPhaseStabilityRange.prof',
+                        help='file the profile is written to')
+    args = parser.parse_args(argv)
+
+    if args.no_plot or args.output is not None:
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    report = RunReport()
+    with profile(args.profile, args.profile_output):
+        run(args, report)
+
+    if args.report is not None:
+        report.to_json(args.report)
+
+
+def run(args, report):
+    """
+    Computes (or loads), converts and plots the stability ranges selected by the command line arguments
+    :param args: arguments parsed by main
+    :param report: RunReport collecting the time of each stage
+    """
+    ######## Input data ########
+    if args.data is not None:
+        with report.stage('load_data'):
+            table = load_stability_ranges(args.data, '{}:{}'.format(args.system, args.open_element))
     else:
-        print("However, 'ConvertTo' variable is set to", "'{}'".format(ConvertTo), 'which '
-              'is associated to', '{}.'.format(
-                  OpenTo), " Thus, it was assumed that the "
-              'system is in fact open to', '{},'.format(
-                  OpenTo), "so that the 'OpenTo' "
-              "variable was overridden and set to this element.")
-# Convert the the data from chemical potential to temperature or voltage,
-# if necessary (i.e., if 'ConvertTo' is not set to 'None').
-if ConvertTo == 'T_C':
-    Xi = [mu2t().print_temperature_corresponding_to_mu_equals(n)['T_Celsius']
-          for n in mu_i]
-    Xf = [mu2t().print_temperature_corresponding_to_mu_equals(n)['T_Celsius']
-          for n in mu_f]
-elif ConvertTo == 'T_K':
-    Xi = [mu2t().print_temperature_corresponding_to_mu_equals(n)['T_Kelvin']
-          for n in mu_i]
-    Xf = [mu2t().print_temperature_corresponding_to_mu_equals(n)['T_Kelvin']
-          for n in mu_f]
-elif ConvertTo == 'V_Li':
-    # -1.908 is the chemical potential of Li at 0 K.
-    Xi = [-1.908 - n for n in mu_i]
-    # -1.908 is the chemical potential of Li at 0 K.
-    Xf = [-1.908 - n for n in mu_f]
-elif ConvertTo == 'V_Na':
-    # -1.313 is the chemical potential of Na at 0 K.
-    Xi = [-1.313 - n for n in mu_i]
-    # -1.313 is the chemical potential of Na at 0 K.
-    Xf = [-1.313 - n for n in mu_f]
-elif ConvertTo == 'None':
-    if OpenTo == 'Li':
-        Xi = [n - (-1.908) for n in mu_i]
-        Xf = [n - (-1.908) for n in mu_f]
-    elif OpenTo == 'Na':
-        Xi = [n - (-1.313) for n in mu_i]
-        Xf = [n - (-1.313) for n in mu_f]
+        table = get_stability_ranges(
+            args.system.split('-'), args.open_element, sweep=args.sweep, workers=args.workers,
+            local_path=None if args.local_path.lower() == 'none' else args.local_path, api_key=args.api_key,
+            report=report, verbose=args.verbose, lower_bound=args.lower_bound,
+            result_cache=None if args.result_cache is None else ResultCache(args.result_cache or None),
+            slim=args.slim, checkpoint=args.checkpoint, progress=print_progress if args.progress else None)
+
+    if args.save_data is not None:
+        if args.save_data.endswith('.npz'):
+            table.save_npz(args.save_data)
+        else:
+            table.save(args.save_data)
+
+    Phase, mu_i, mu_f = table.phases, table.mu_start, table.mu_end
+    system = '{}:{}'.format(args.system, args.open_element)
+    reference = table.get_reference(system if len(table.systems) > 1 else table.systems[0])
+
+    XLabel, OpenTo, Convert = get_axis_label(args.open_element, args.convert_to)
+    species = get_open_species(OpenTo)
+    thermodynamics = None
+    if Convert in ('T_C', 'T_K'):
+        thermodynamics = species.get_thermodynamics(reference)
+        if args.shomate_table:
+            thermodynamics.use_table()
+    with report.stage('convert'):
+        Xi, Xf = convert_chempots(mu_i, mu_f, OpenTo, Convert, reference, thermodynamics)
+
+    if thermodynamics is not None:
+        # Boundaries shared by adjacent phases are solved once, so the requested minus the unique
+        # chemical potentials are the conversions saved
+        mu = np.concatenate([mu_i, mu_f])
+        report.count('mu_to_temperature_requested', int(np.count_nonzero(np.isfinite(mu))))
+        report.count('mu_to_temperature_unique', thermodynamics.solver_calls)
+        report.count('mu_to_temperature_iterations', thermodynamics.solver_iterations)
+
+    if args.no_plot:
+        print('{:<16}{:>14}{:>14}{:>14}{:>14}'.format('phase', 'mu_start', 'mu_end', 'X_start', 'X_end'))
+        for row in zip(Phase, mu_i, mu_f, Xi, Xf):
+            print('{:<16}{:>14.4f}{:>14.4f}{:>14.4f}{:>14.4f}'.format(*row))
+        return
+
+    # The end of the ranges, in the plotted quantity. An open last interval (lower bound -inf)
+    # is drawn up to a margin past the farthest transition, where it is clipped
+    if args.xmax is not None:
+        LastPotential = args.xmax
     else:
-        Xi = [mu_i[0] - n for n in mu_i]
-        print(Xi)
-        Xf = [mu_i[0] - n for n in mu_f]
-        print(Xf)
-
-# Initialize label color. Trim initial and final X values, based on the
-# X range. Also, if the bar color is too dark, change the label
-# color to white instead of black. Put the phase labels in boldface.
-LabelColor = ['black']*len(Phase)
-for n in range(0, len(Phase)):
-    if Xi[n] < Xmin:
-        Xi[n] = Xmin
-    if Xf[n] > Xmax:
-        Xf[n] = Xmax
-    # if BarColor[n] in ['black','Black','brown','Brown','navy','Navy','blue','Blue','green','Green', 'red', 'Red', 'green', 'Green', 'lime', 'Lime', 'indigo', 'Indigo', 'navy', 'Navy', 'darkorange', 'Darkorange']:
-        #LabelColor[n] = 'white'
-    Phase[n] = '${'+Phase[n]+'}$'
-#Xf[1] = 563.45
-# Calculate range and center of X axis quantity for each phase. Generate y positions.
-Xr = (np.array(Xf) - np.array(Xi)).tolist()
-Xc = ((np.array(Xf) + np.array(Xi))/2).tolist()
-BarYPos = np.arange(len(Phase))
-# BarYPos[3] = BarYPos[2]
-# BarYPos[4] = BarYPos[2]
-# BarYPos[5] = BarYPos[1]
-
-
-######## Plot generation ########
-fig, ax = plt.subplots(figsize=(6, 2), dpi=115)
-# Set plot limits.
-ax.set(xlim=Xlim, ylim=Ylim, autoscale_on=False)
-# Generate bars.
-ax.barh(y=BarYPos, left=Xi, width=Xr,
-        height=BarHeight, align='edge', color=BarColor)
-# Generate phase labels.
-LabelProps = {'horizontalalignment': 'center', 'verticalalignment': 'center',
-              'fontsize': PhaseLabelSize, 'fontweight': 'bold'}
-for n in range(0, len(Phase)):
-    ax.text(x=Xc[n], y=BarYPos[n]+BarHeight/2,
-            s=Phase[n], color=LabelColor[n], **LabelProps)
-# Generate axes labels.
-ax.set_xlabel(XLabel, fontsize=AxisFontSize, labelpad=LabelShift)
-ax.set_ylabel(YLabel, fontsize=AxisFontSize, labelpad=LabelShift)
-# Set major and minor ticks spacing, direction, and respective label size
-ax.xaxis.set_major_locator(plt.MultipleLocator(MajorTickSpacing))
-ax.xaxis.set_minor_locator(plt.MultipleLocator(MinorTickSpacing))
-ax.tick_params(axis='both', which='both', direction='in',
-               labelsize=TickFontSize, width=0.8)
-ax.tick_params(axis='both', which='minor', length=3)
-ax.tick_params(axis='both', which='major', length=5)
-ax.set_yticks([])
-# Set vertical grid lines. Choose if they follow only major ticks,
-# minor ticks or both. Set grid transparency.
-ax.grid(axis='x', which='minor', alpha=1-Transparency/100)
-
-#plt.savefig("LiCaO-Li+", dpi=1200)
-plt.show()
+        X = np.concatenate([Xi, Xf])
+        finite = X[np.isfinite(X)]
+        if len(finite) == 0:
+            finite = np.array([args.xmin + 1.0])
+        LastPotential = finite[np.argmax(np.abs(finite - args.xmin))]
+        if len(finite) < len(X):
+            LastPotential += 0.1*(LastPotential - args.xmin)
+
+    # Range of the plotted quantity. If ConvertTo is set no 'None', the
+    # quantity is the chemical potential. If it is set to 'T_C' or 'T_K', the
+    # quantity is the temperature in °C or K, respectively. If it is set to
+    # 'V_Li', 'V_Na', ... the quantity is V vs. Li/Li+, Na/Na+, ..., respectively.
+    Xlim = args.xmin, LastPotential
+
+    with report.stage('render'):
+        plot_stability_range(Phase, Xi, Xf, XLabel, Xlim, output=args.output, dpi=args.dpi,
+                             MinorTickSpacing=args.minor_tick, MajorTickSpacing=args.major_tick)
+
+
+if __name__ == '__main__':
+    main()
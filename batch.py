@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Screens many open chemical systems in one run. The entries of the union of all the
+systems are fetched and processed once, then each system is analyzed on its own slice
+of them, in parallel. With --concurrency, the entries of each system are instead
+downloaded on their own, many at a time, which avoids querying the (much larger)
+union chemical space when the systems have little in common. Results are written as CSV, one row per
+(system, open element, phase, initial chemical potential, final chemical potential, reference chemical
+potential of the open element).
+
+Usage: python batch.py Li-Ca-O:O Li-Fe-P-O:Li --workers 4 > ranges.csv
+"""
+
+import argparse
+import csv
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+from entry_cache import EntryCache
+from entry_fetcher import EntryFetcher
+from entry_store import EntryStore
+from stability_ranges import StabilityRangeTable
+
+# Processed entries of the union chemical space, set once per worker process by the pool initializer.
+_worker_entries = None
+
+
+def _init_batch_worker(entries):
+    global _worker_entries
+    _worker_entries = entries
+
+
+def parse_job(text):
+    """
+    Parses a job given as "Li-Ca-O:O"
+    :param text: elements of the system separated by "-", then ":" and the open element
+    :return: (list of elements, open element)
+    """
+    system, _, open_element = text.partition(":")
+    if not open_element:
+        raise ValueError("'{}' has no open element; use e.g. 'Li-Ca-O:O'".format(text))
+
+    return system.split("-"), open_element
+
+
+def get_union_system(jobs):
+    """
+    :param jobs: list of (elements, open element)
+    :return: sorted list of all elements of all jobs
+    """
+    return sorted(set(el for system, open_element in jobs for el in list(system) + [open_element]))
+
+
+def slice_entries(entries, system):
+    """
+    Entries whose elements all belong to the system
+    :param entries: entries of a larger chemical space
+    :param system: elements of the system
+    :return: list of entries
+    """
+    elements = set(system)
+    return [entry for entry in entries
+            if set(el.symbol for el in entry.composition.elements) <= elements]
+
+
+def analyze_job(job, entries=None, sweep="facets", lower_bound=None):
+    """
+    Stability range of each phase of one job
+    :param job: (elements, open element)
+    :param entries: processed entries of a chemical space containing the system, or an EntryStore of them.
+        None uses the ones given to the worker process
+    :param sweep: sweep used by PhaseDiagramOpenAnalyzer
+    :param lower_bound: chemical potential closing the last interval. None leaves it open (-inf)
+    :return: list of rows (system, open element, phase, initial chemical potential, final chemical potential,
+        reference chemical potential of the open element), one per stability window
+    """
+    system, open_element = job
+    if entries is None:
+        entries = _worker_entries
+
+    if isinstance(entries, EntryStore):
+        entries = entries.select(entries.get_rows(system))
+    else:
+        entries = slice_entries(entries, system)
+
+    analyzer = PhaseDiagramOpenAnalyzer(system=system, open_element=open_element, sweep=sweep,
+                                        lower_bound=lower_bound)
+    ranges = analyzer.get_phase_diagram_data(entries=entries)
+
+    chemsys = "-".join(system)
+    return [(chemsys, open_element, phase, mu_start, mu_end, analyzer.reference_chempot)
+            for phase, windows in ranges.items() for mu_start, mu_end in windows]
+
+
+def analyze_systems(jobs, workers=None, sweep="facets", entry_cache=None, local_path=None,
+                    local_manifest=None, api_key=None, lower_bound=None, fetcher=None, slim=False):
+    """
+    Analyzes many open chemical systems, fetching the entries of all of them only once
+    :param jobs: list of (elements, open element)
+    :param workers: number of processes analyzing the systems. None or 1 analyzes them in this process
+    :param sweep: sweep used by PhaseDiagramOpenAnalyzer
+    :param entry_cache: EntryCache used to fetch the entries
+    :param local_path: directory scanned for local VASP calculations. None skips the scan
+    :param local_manifest: manifest of the local calculations
+    :param api_key: Materials Project API key
+    :param lower_bound: chemical potential closing the last interval of every system. None leaves it open
+    :param fetcher: EntryFetcher. If given, the entries of each system are downloaded separately and
+        concurrently (the downloads of all the systems missing from the entry cache start at once)
+        instead of those of the union of the systems
+    :param slim: reduce the entries to an EntryStore, so that only compositions, energies and ids
+        are kept in memory and sent to the worker processes
+    :return: generator of rows (see analyze_job), in the order of the jobs
+    """
+    if fetcher is not None:
+        yield from analyze_systems_separately(jobs, workers, sweep, entry_cache, local_path, local_manifest,
+                                              lower_bound, fetcher, slim)
+        return
+
+    union = PhaseDiagramOpenAnalyzer(system=get_union_system(jobs), entry_cache=entry_cache,
+                                     local_path=local_path, local_manifest=local_manifest, api_key=api_key)
+    entries = union.get_entries()
+    if slim:
+        entries = EntryStore.from_entries(entries)
+
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(entries,)) as executor:
+            for rows in executor.map(analyze_job, jobs, [None] * len(jobs), [sweep] * len(jobs),
+                                     [lower_bound] * len(jobs)):
+                yield from rows
+    else:
+        for job in jobs:
+            yield from analyze_job(job, entries, sweep, lower_bound)
+
+
+def analyze_systems_separately(jobs, workers, sweep, entry_cache, local_path, local_manifest, lower_bound,
+                                fetcher, slim=False):
+    """
+    Same as analyze_systems, but with the entries of each system fetched on their own through fetcher.
+    The local calculations are scanned once, and each system gets its slice of them. With workers,
+    each system is sent to the pool as soon as its download finishes, and at most 2 * workers
+    systems are held in this process at a time
+    """
+    systems = [list(system) + [open_element] for system, open_element in jobs]
+    compatibility = PhaseDiagramOpenAnalyzer.compatibility.__name__
+    # Jobs of the same chemical system share their download
+    downloads = {}
+    for index, system in enumerate(systems):
+        if entry_cache is None or not entry_cache.offline and not entry_cache.contains(system, compatibility):
+            downloads.setdefault(fetcher.fetch(system), []).append(index)
+
+    local_entries = PhaseDiagramOpenAnalyzer(local_path=local_path, local_manifest=local_manifest).get_local_entries()
+
+    def get_entries(system):
+        analyzer = PhaseDiagramOpenAnalyzer(system=system, entry_cache=entry_cache, fetcher=fetcher)
+        entries = analyzer.get_entries(slice_entries(local_entries, system))
+        return EntryStore.from_entries(entries) if slim else entries
+
+    if workers is not None and workers > 1:
+        # Cached systems first, then the others in the order their downloads finish
+        def get_ready_indices():
+            downloaded = set(index for indices in downloads.values() for index in indices)
+            yield from (index for index in range(len(systems)) if index not in downloaded)
+            for future in as_completed(downloads):
+                yield from downloads[future]
+
+        # Rows are still yielded in the order of the jobs
+        rows = {}
+        next_index = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for submitted, index in enumerate(get_ready_indices(), 1):
+                pending[executor.submit(analyze_job, jobs[index], get_entries(systems[index]), sweep,
+                                        lower_bound)] = index
+                while pending and (len(pending) >= 2 * workers or submitted == len(systems)):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        rows[pending.pop(future)] = future.result()
+                    while next_index in rows:
+                        yield from rows.pop(next_index)
+                        next_index += 1
+    else:
+        for job, system in zip(jobs, systems):
+            yield from analyze_job(job, get_entries(system), sweep, lower_bound)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stability range of the phases of many open chemical systems")
+    parser.add_argument("jobs", nargs="*", help="systems and open elements, e.g. Li-Ca-O:O")
+    parser.add_argument("--input", help="file with one system and open element per line")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--sweep", choices=PhaseDiagramOpenAnalyzer.sweeps, default="facets")
+    parser.add_argument("--cache", action="store_true", help="cache the Materials Project entries on disk")
+    parser.add_argument("--offline", action="store_true", help="only use cached entries")
+    parser.add_argument("--local-path", default=None, help="directory with local VASP calculations")
+    parser.add_argument("--local-manifest", default=None, help="manifest of the local VASP calculations")
+    parser.add_argument("--api-key", default=None, help="Materials Project API key")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="download the entries of each system separately, this many at a time")
+    parser.add_argument("--slim", action="store_true",
+                        help="keep only the compositions, energies and ids of the entries in memory")
+    parser.add_argument("--lower-bound", type=float, default=None,
+                        help="chemical potential (eV) closing the last interval; by default it is left open (-inf)")
+    parser.add_argument("--save", default=None,
+                        help="also save the rows as a StabilityRangeTable (.npz, or a .npy directory)")
+    args = parser.parse_args(argv)
+
+    texts = list(args.jobs)
+    if args.input:
+        with open(args.input) as f:
+            texts.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not texts:
+        parser.error("no systems given")
+    jobs = [parse_job(text) for text in texts]
+
+    entry_cache = EntryCache(offline=args.offline) if args.cache or args.offline else None
+    fetcher = EntryFetcher(args.api_key, args.concurrency) if args.concurrency else None
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["system", "open_element", "phase", "mu_start", "mu_end", "reference"])
+    rows = []
+    for row in analyze_systems(jobs, args.workers, args.sweep, entry_cache, args.local_path, args.local_manifest,
+                               args.api_key, args.lower_bound, fetcher, args.slim):
+        writer.writerow(row)
+        sys.stdout.flush()
+        if args.save is not None:
+            rows.append(row)
+    if fetcher is not None:
+        fetcher.close()
+
+    if args.save is not None:
+        table = StabilityRangeTable.from_rows(rows)
+        if args.save.endswith(".npz"):
+            table.save_npz(args.save)
+        else:
+            table.save(args.save)
+
+
+if __name__ == "__main__":
+    main()
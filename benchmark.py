@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths: mu <-> T conversions (scalar and batched),
+get_phase_diagram_data on synthetic PDEntry sets from ternary to 6-component systems
+(no network access), and figure rendering. Each run saves its results as JSON (benchmark.json
+by default), which a later run can be compared with. The same cases make up the pytest-benchmark
+suite in tests/test_benchmarks.py.
+
+Usage: python benchmark.py
+       python benchmark.py --compare benchmark.json --save after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+
+import numpy as np
+from thermodynamics import Thermodynamics
+
+ELEMENTS = ["Li", "Ca", "Fe", "Mn", "P", "O"]
+# File the results are saved to unless --save says otherwise
+BASELINE = "benchmark.json"
+
+
+def timeit(function, repeat=3):
+    """
+    :return: best wall time of repeat calls of function, in s
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def synthetic_entries(elements, number_of_entries, seed=0):
+    """
+    Random PDEntry set with one entry per element and number_of_entries compounds of
+    random compositions, all below the elemental references
+    :param elements: element symbols; the open element should be among them
+    :param number_of_entries: number of compounds
+    :param seed: random seed, so that every run uses the same entries
+    :return: list of PDEntry
+    """
+    from pymatgen.analysis.phase_diagram import PDEntry
+    from pymatgen.core.composition import Composition
+
+    rnd = random.Random(seed)
+    references = {el: -rnd.uniform(1.0, 9.0) for el in elements}
+    entries = [PDEntry(Composition({el: 1}), energy) for el, energy in references.items()]
+    for _ in range(number_of_entries):
+        composition = Composition({el: rnd.randint(1, 4)
+                                   for el in rnd.sample(elements, rnd.randint(2, len(elements)))})
+        energy = sum(amount*references[el.symbol] for el, amount in composition.items())
+        entries.append(PDEntry(composition, energy - rnd.uniform(0.0, 1.5)*composition.num_atoms))
+
+    return entries
+
+
+def get_thermodynamics_cases():
+    """
+    Scalar, batched and tabulated mu <-> T conversions
+    :return: dict of benchmark names and functions without arguments
+    """
+    thermodynamics = Thermodynamics()
+    table = Thermodynamics()
+    table.use_table()
+
+    mu = np.linspace(-9.0, -4.6, 100000)
+    temperatures = np.linspace(100.0, 3000.0, 100000)
+
+    return {
+        "mu_to_temperature/scalar/1000": lambda: [thermodynamics.mu_to_temperature(m) for m in mu[::100]],
+        "mu_to_temperature/array/100000": lambda: thermodynamics.mu_to_temperature_array(mu),
+        "mu_to_temperature/table/100000": lambda: table.mu_to_temperature_array(mu),
+        "temperature_to_mu/scalar/1000": lambda: [thermodynamics.temperature_to_mu(t) for t in temperatures[::100]],
+        "temperature_to_mu/array/100000": lambda: thermodynamics.temperature_to_mu_array(temperatures),
+        "temperature_to_mu/table/100000": lambda: table.temperature_to_mu_array(temperatures),
+    }
+
+
+def get_phase_diagram_cases(sizes=(10, 100, 1000, 5000), max_grand_potential_entries=1000):
+    """
+    Ternary to 6-component systems open to oxygen, with sizes synthetic entries each
+    :return: list of (name, elements, number_of_entries, sweep)
+    """
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    cases = []
+    for number_of_elements in range(3, len(ELEMENTS) + 1):
+        elements = ELEMENTS[:number_of_elements - 1] + ["O"]
+        for number_of_entries in sizes:
+            for sweep in PhaseDiagramOpenAnalyzer.sweeps:
+                if sweep == "grand_potential" and number_of_entries > max_grand_potential_entries:
+                    continue
+                name = "get_phase_diagram_data/{}/{}-component/{}".format(sweep, number_of_elements,
+                                                                          number_of_entries)
+                cases.append((name, elements, number_of_entries, sweep))
+
+    return cases
+
+
+def get_phase_diagram_function(elements, number_of_entries, sweep):
+    """
+    :return: function without arguments running get_phase_diagram_data on the synthetic entries
+    """
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    entries = synthetic_entries(elements, number_of_entries)
+    analyzer = PhaseDiagramOpenAnalyzer(system=elements, open_element="O", sweep=sweep)
+
+    return lambda: analyzer.get_phase_diagram_data(entries=entries)
+
+
+def get_rendering_cases(directory, number_of_figures=20):
+    """
+    Figures of 2 to 10 random stability ranges, written to directory
+    :return: dict of benchmark names and functions without arguments
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from PlotPhaseStabilityRange import StabilityRangeRenderer, plot_stability_range
+
+    rnd = random.Random(0)
+    jobs = []
+    for n in range(number_of_figures):
+        number_of_phases = rnd.randint(2, 10)
+        Xi = [rnd.uniform(0.0, 800.0) for _ in range(number_of_phases)]
+        Xf = [x + rnd.uniform(50.0, 800.0) for x in Xi]
+        Phase = ["Li_{}CaO".format(k) for k in range(number_of_phases)]
+        jobs.append((Phase, Xi, Xf, "Temperature (°C)", (0.0, 1400.0),
+                     os.path.join(directory, "{}.png".format(n))))
+
+    renderer = StabilityRangeRenderer()
+    return {
+        "render/plot_stability_range/{}".format(number_of_figures):
+            lambda: [plot_stability_range(*job[:5], output=job[5]) for job in jobs],
+        "render/StabilityRangeRenderer/{}".format(number_of_figures):
+            lambda: [renderer.render(*job) for job in jobs],
+    }
+
+
+def benchmark_thermodynamics(repeat):
+    return {name: timeit(function, repeat) for name, function in get_thermodynamics_cases().items()}
+
+
+def benchmark_phase_diagram(repeat, sizes, max_grand_potential_entries):
+    results = {}
+    for name, elements, number_of_entries, sweep in get_phase_diagram_cases(sizes, max_grand_potential_entries):
+        results[name] = timeit(get_phase_diagram_function(elements, number_of_entries, sweep), repeat)
+
+    return results
+
+
+def benchmark_rendering(repeat, number_of_figures=20):
+    with tempfile.TemporaryDirectory() as directory:
+        return {name: timeit(function, repeat)
+                for name, function in get_rendering_cases(directory, number_of_figures).items()}
+
+
+def compare(results, baseline):
+    """
+    Prints the time of each benchmark relative to the baseline (> 1 is slower)
+    """
+    print("{:<60}{:>12}{:>12}{:>9}".format("benchmark", "baseline", "current", "ratio"))
+    for name, seconds in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            print("{:<60}{:>12}{:>12.4f}{:>9}".format(name, "-", seconds, "new"))
+        else:
+            print("{:<60}{:>12.4f}{:>12.4f}{:>9.2f}".format(name, reference, seconds, seconds/reference))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the hot paths")
+    parser.add_argument("--only", choices=["thermodynamics", "phase_diagram", "rendering"], action="append",
+                        help="run only these groups (may be repeated)")
+    parser.add_argument("--repeat", type=int, default=3, help="calls per benchmark; the best time is kept")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000],
+                        help="numbers of synthetic entries")
+    parser.add_argument("--max-grand-potential-entries", type=int, default=1000,
+                        help="largest entry set benchmarked with the grand_potential sweep")
+    parser.add_argument("--save", default=BASELINE,
+                        help="save the results as JSON to this file ('none' does not save them)")
+    parser.add_argument("--compare", default=None,
+                        help="compare with results saved by an earlier run, e.g. " + BASELINE)
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["thermodynamics", "phase_diagram", "rendering"]
+    benchmarks = {}
+    if "thermodynamics" in groups:
+        benchmarks.update(benchmark_thermodynamics(args.repeat))
+    if "phase_diagram" in groups:
+        benchmarks.update(benchmark_phase_diagram(args.repeat, args.sizes, args.max_grand_potential_entries))
+    if "rendering" in groups:
+        benchmarks.update(benchmark_rendering(args.repeat))
+
+    results = {
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "benchmarks": benchmarks,
+    }
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, seconds in benchmarks.items():
+            print("{:<60}{:>12.4f}".format(name, seconds))
+
+    if args.save.lower() != "none":
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
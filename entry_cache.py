@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from monty.json import MontyDecoder, MontyEncoder
+from result_cache import DEFAULT_CACHE_DIR
+
+
+class EntryCache:
+    """
+    Local on-disk cache of the entries downloaded from the Materials Project.
+    Entries are stored in SQLite as compressed JSON of their as_dict(), one row per
+    chemical system and compatibility scheme.
+    """
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600.0, max_systems=1000, offline=False,
+                 max_corrected_entries=500000):
+        """
+        Entry cache constructor
+        :param path: SQLite file. Defaults to entries.sqlite in ~/.cache/PlotPhaseStabilityRange
+        :param ttl: seconds after which a cached chemical system is downloaded again. None never expires
+        :param max_systems: maximum number of chemical systems kept; the least recently used are evicted
+        :param offline: never download; systems missing from the cache raise LookupError
+        :param max_corrected_entries: maximum number of entry corrections kept (see process_entries);
+            the least recently used are evicted
+        """
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "entries.sqlite")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.ttl = ttl
+        self.max_systems = max_systems
+        self.offline = offline
+        self.max_corrected_entries = max_corrected_entries
+        self.correction_hits = 0
+        self.correction_misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "chemsys TEXT, compatibility TEXT, created REAL, accessed REAL, data BLOB, "
+            "PRIMARY KEY (chemsys, compatibility))")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS corrections ("
+            "key TEXT PRIMARY KEY, accessed REAL, correction REAL, adjustments TEXT)")
+        self.connection.commit()
+
+    @staticmethod
+    def get_chemsys(system):
+        """
+        Cache key of a chemical system
+        :param system: elements of the system, e.g. ["Li", "Ca", "O"]
+        :return: sorted chemical system, e.g. "Ca-Li-O"
+        """
+        return "-".join(sorted(set(str(el) for el in system)))
+
+    @staticmethod
+    def encode(entries):
+        return zlib.compress(json.dumps([entry.as_dict() for entry in entries], cls=MontyEncoder).encode())
+
+    @staticmethod
+    def decode(data):
+        return MontyDecoder().process_decoded(json.loads(zlib.decompress(data).decode()))
+
+    def is_expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def find(self, system, compatibility):
+        """
+        :param system: elements of the system
+        :param compatibility: name of the compatibility scheme
+        :return: the system itself if it is cached, otherwise its smallest cached superset, or None
+        """
+        elements = set(self.get_chemsys(system).split("-"))
+
+        candidates = []
+        for cached_chemsys, created in self.connection.execute(
+                "SELECT chemsys, created FROM entries WHERE compatibility = ?", (compatibility,)):
+            cached_elements = set(cached_chemsys.split("-"))
+            if elements <= cached_elements and not self.is_expired(created):
+                candidates.append((len(cached_elements), cached_chemsys))
+        if not candidates:
+            return None
+
+        return min(candidates)[1]
+
+    def contains(self, system, compatibility):
+        """
+        Whether get would return the entries of a chemical system, without reading them
+        """
+        return self.find(system, compatibility) is not None
+
+    def get(self, system, compatibility):
+        """
+        Cached entries of a chemical system. If the system itself is not cached, its
+        entries are taken from the smallest cached superset of it (e.g. Li-O from Li-Ca-O).
+        :param system: elements of the system
+        :param compatibility: name of the compatibility scheme
+        :return: list of entries, or None if neither the system nor a superset of it is cached
+        """
+        chemsys = self.get_chemsys(system)
+        elements = set(chemsys.split("-"))
+
+        cached_chemsys = self.find(system, compatibility)
+        if cached_chemsys is None:
+            return None
+
+        data, = self.connection.execute(
+            "SELECT data FROM entries WHERE chemsys = ? AND compatibility = ?",
+            (cached_chemsys, compatibility)).fetchone()
+        self.connection.execute(
+            "UPDATE entries SET accessed = ? WHERE chemsys = ? AND compatibility = ?",
+            (time.time(), cached_chemsys, compatibility))
+        self.connection.commit()
+
+        entries = self.decode(data)
+        if cached_chemsys == chemsys:
+            return entries
+
+        return [entry for entry in entries
+                if set(el.symbol for el in entry.composition.elements) <= elements]
+
+    def put(self, system, compatibility, entries):
+        """
+        Stores the entries of a chemical system, evicting expired systems and the least
+        recently used ones beyond max_systems
+        :param system: elements of the system
+        :param compatibility: name of the compatibility scheme
+        :param entries: entries of the whole chemical system, including its subsystems
+        """
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (self.get_chemsys(system), compatibility, now, now, self.encode(entries)))
+
+        if self.ttl is not None:
+            self.connection.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        if self.max_systems is not None:
+            self.connection.execute(
+                "DELETE FROM entries WHERE rowid NOT IN "
+                "(SELECT rowid FROM entries ORDER BY accessed DESC LIMIT ?)", (self.max_systems,))
+        self.connection.commit()
+
+    def get_or_fetch(self, system, compatibility, fetch):
+        """
+        Cached entries of a chemical system, downloading and storing them if needed
+        :param system: elements of the system
+        :param compatibility: name of the compatibility scheme
+        :param fetch: function without arguments that downloads the entries of the system
+        :return: list of entries
+        """
+        entries = self.get(system, compatibility)
+        if entries is not None:
+            return entries
+
+        if self.offline:
+            raise LookupError("Chemical system {} is not cached and the entry cache is offline".format(
+                self.get_chemsys(system)))
+
+        entries = fetch()
+        self.put(system, compatibility, entries)
+
+        return entries
+
+    @staticmethod
+    def get_entry_key(entry, compatibility):
+        """
+        Key of the correction of an entry: its entry_id, formula, uncorrected energy and calculation
+        parameters, which are what the corrections depend on, and the compatibility scheme (class and
+        version), so that any change to either is a miss
+        """
+        text = "{}|{}|{!r}|{}|{}".format(entry.entry_id, entry.composition.formula, float(entry.uncorrected_energy),
+                                         json.dumps(entry.parameters, sort_keys=True, default=str), compatibility)
+
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    @staticmethod
+    def decode_adjustments(text):
+        """
+        Energy adjustments stored by process_entries, built from the arguments in their as_dict(). Unlike
+        MontyDecoder, this keeps cls, the dict of the scheme that made them, a dict instead of building a
+        new instance of the scheme from it
+        """
+        adjustments = []
+        for adjustment in json.loads(text):
+            cls = getattr(importlib.import_module(adjustment["@module"]), adjustment["@class"])
+            adjustments.append(cls(**{key: value for key, value in adjustment.items() if not key.startswith("@")}))
+
+        return adjustments
+
+    def process_entries(self, entries, compatibility, process_entry):
+        """
+        Same as Compatibility.process_entries, but the correction of entries already processed with the
+        same compatibility scheme is taken from the cache and set on them instead of being computed again.
+        Only the correction is stored (NULL for incompatible entries), with the JSON of the energy
+        adjustments it is made of on pymatgen versions that have them, so that Compatibility.explain
+        still itemizes it. A hit costs a key and decoding those few adjustments
+        :param entries: uncorrected entries. Like process_entry, the correction is set on them in place
+        :param compatibility: name and version of the compatibility scheme
+        :param process_entry: function correcting one entry in place, returning None if it is not compatible
+            (e.g. MaterialsProjectCompatibility().process_entry)
+        :return: list of corrected entries, in the same order, without the incompatible ones
+        """
+        keys = [self.get_entry_key(entry, compatibility) for entry in entries]
+
+        cached = {}
+        unique_keys = list(set(keys))
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            for key, correction, adjustments in self.connection.execute(
+                    "SELECT key, correction, adjustments FROM corrections WHERE key IN ({})".format(
+                        ",".join("?" * len(chunk))), chunk):
+                cached[key] = correction, adjustments
+
+        now = time.time()
+        processed = []
+        new_rows = []
+        for key, entry in zip(keys, entries):
+            if key in cached:
+                self.correction_hits += 1
+                correction, adjustments = cached[key]
+                if correction is None:
+                    continue
+                if adjustments is not None:
+                    entry.energy_adjustments = self.decode_adjustments(adjustments)
+                else:
+                    entry.correction = correction
+                processed.append(entry)
+            else:
+                self.correction_misses += 1
+                corrected = process_entry(entry)
+                correction = adjustments = None
+                if corrected is not None:
+                    correction = corrected.correction
+                    if hasattr(corrected, "energy_adjustments"):
+                        adjustments = json.dumps([adjustment.as_dict()
+                                                  for adjustment in corrected.energy_adjustments],
+                                                 cls=MontyEncoder)
+                    processed.append(corrected)
+                cached[key] = correction, adjustments
+                new_rows.append((key, now, correction, adjustments))
+
+        self.connection.executemany("INSERT OR REPLACE INTO corrections VALUES (?, ?, ?, ?)", new_rows)
+        self.connection.executemany("UPDATE corrections SET accessed = ? WHERE key = ?",
+                                    [(now, key) for key in unique_keys])
+        if self.max_corrected_entries is not None:
+            self.connection.execute(
+                "DELETE FROM corrections WHERE rowid NOT IN "
+                "(SELECT rowid FROM corrections ORDER BY accessed DESC LIMIT ?)", (self.max_corrected_entries,))
+        self.connection.commit()
+
+        return processed
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_transient_errors():
+    """
+    Exception types of the failures worth retrying: connection errors and timeouts, including the ones of
+    requests, the HTTP library of MPRester, which do not derive from the built-in ones
+    """
+    errors = (ConnectionError, TimeoutError)
+    try:
+        import requests
+    except ImportError:
+        return errors
+
+    return errors + (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class EntryFetcher:
+    """
+    Downloads the entries of many chemical systems from the Materials Project concurrently.
+    Requests run on a bounded thread pool; each thread keeps its own MPRester, so its HTTP
+    session (and connection) is reused from one request to the next. Failed requests are
+    retried with exponential backoff when they fail with a transient error, and requests for a chemical system that is already
+    being (or has been) downloaded share the same download.
+    """
+
+    def __init__(self, api_key=None, max_concurrency=4, retries=3, backoff=1.0, retry_on=None,
+                 rester_factory=None):
+        """
+        Entry fetcher constructor
+        :param api_key: Materials Project API key
+        :param max_concurrency: maximum number of requests running at the same time
+        :param retries: number of times a failed request is retried
+        :param backoff: seconds waited before the first retry; doubled at each new retry
+        :param retry_on: exception types after which a request is retried. MPRester wraps the errors of a request
+            in MPRestError, so the exceptions it was raised from are checked too. Defaults to connection errors
+            and timeouts (see get_transient_errors); other failures, e.g. a rejected API key, are raised at once
+        :param rester_factory: function without arguments returning the client of a thread. Defaults to
+            MPRester(api_key)
+        """
+        if rester_factory is None:
+            def rester_factory():
+                from pymatgen.ext.matproj import MPRester
+                return MPRester(api_key)
+
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_on = retry_on if retry_on is not None else get_transient_errors()
+        self.rester_factory = rester_factory
+        self.requests = 0
+        self.retried = 0
+        self.coalesced = 0
+
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.resters = []
+        self.futures = {}
+
+    @staticmethod
+    def get_chemsys(system):
+        return "-".join(sorted(set(str(el) for el in system)))
+
+    def get_rester(self):
+        """
+        :return: client of the current thread, created on its first request
+        """
+        rester = getattr(self.local, "rester", None)
+        if rester is None:
+            rester = self.local.rester = self.rester_factory()
+            with self.lock:
+                self.resters.append(rester)
+        return rester
+
+    def is_retried(self, error):
+        """
+        Whether a failed request is retried: error, or an exception it was raised from, is one of retry_on
+        """
+        while error is not None:
+            if isinstance(error, self.retry_on):
+                return True
+            error = error.__cause__ or error.__context__
+        return False
+
+    def download(self, elements):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.lock:
+                    self.requests += 1
+                return self.get_rester().get_entries_in_chemsys(elements, compatible_only=True)
+            except Exception as error:
+                if attempt == self.retries or not self.is_retried(error):
+                    raise
+                with self.lock:
+                    self.retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch(self, system):
+        """
+        Starts the download of the entries of a chemical system, unless it was already started
+        :param system: elements of the system
+        :return: Future of the list of entries
+        """
+        chemsys = self.get_chemsys(system)
+        with self.lock:
+            future = self.futures.get(chemsys)
+            # A failed download may not have been forgotten yet: its waiters are woken before its callbacks run
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.coalesced += 1
+                return future
+            future = self.futures[chemsys] = self.executor.submit(self.download, chemsys.split("-"))
+
+        # A failed download is not kept, so that a later request tries again
+        def forget_failed(done):
+            if done.exception() is not None:
+                with self.lock:
+                    if self.futures.get(chemsys) is done:
+                        del self.futures[chemsys]
+
+        future.add_done_callback(forget_failed)
+
+        return future
+
+    def get_entries(self, system):
+        """
+        Entries of a chemical system, waiting for their download
+        """
+        return self.fetch(system).result()
+
+    def fetch_many(self, systems):
+        """
+        Downloads the entries of many chemical systems concurrently
+        :param systems: list of systems, each a list of elements
+        :return: list of lists of entries, in the order of the systems
+        """
+        futures = [self.fetch(system) for system in systems]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown()
+        for rester in self.resters:
+            session = getattr(rester, "session", None)
+            if session is not None:
+                session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
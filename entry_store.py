@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class EntryStore:
+    """
+    Slim, array-backed copy of a set of entries: the amount of each element, the corrected
+    energy, the entry_id and the name of every entry, and nothing else (no structures,
+    parameters or data dicts). It is what the hull work needs, takes a few tens of bytes per
+    entry and pickles as a handful of arrays, so it is cheap to send to worker processes.
+    PDEntry objects are rebuilt from it on demand; their attribute is the row of the entry,
+    which maps stable phases back to the full entries.
+    """
+
+    def __init__(self, elements, amounts, energies, entry_ids, names):
+        """
+        Entry store constructor
+        :param elements: element symbols, one per column of amounts
+        :param amounts: array of shape (number of entries, number of elements)
+        :param energies: corrected total energy of each entry, in eV
+        :param entry_ids: entry_id of each entry ('' if it has none)
+        :param names: name of each entry, used as the phase label
+        """
+        self.elements = list(elements)
+        self.amounts = np.asarray(amounts, dtype=float)
+        self.energies = np.asarray(energies, dtype=float)
+        self.entry_ids = np.asarray(entry_ids, dtype=str)
+        self.names = np.asarray(names, dtype=str)
+
+    def __len__(self):
+        return len(self.energies)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.amounts, self.energies, self.entry_ids, self.names))
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Store of processed entries (ComputedEntry, PDEntry, ...)
+        """
+        elements = sorted(set(el.symbol for entry in entries for el in entry.composition.elements))
+        columns = {el: i for i, el in enumerate(elements)}
+
+        amounts = np.zeros((len(entries), len(elements)))
+        for row, entry in enumerate(entries):
+            for el, amount in entry.composition.items():
+                amounts[row, columns[el.symbol]] = amount
+
+        return cls(elements, amounts, [entry.energy for entry in entries],
+                   [getattr(entry, "entry_id", None) or "" for entry in entries], [entry.name for entry in entries])
+
+    def get_rows(self, system):
+        """
+        :param system: elements of a system
+        :return: rows of the entries whose elements all belong to the system
+        """
+        outside = [i for i, el in enumerate(self.elements) if el not in set(system)]
+        return np.flatnonzero(~np.any(self.amounts[:, outside] > 0.0, axis=1))
+
+    def select(self, rows):
+        """
+        :return: EntryStore with the given rows, keeping only the elements they contain
+        """
+        amounts = self.amounts[rows]
+        columns = np.flatnonzero(np.any(amounts > 0.0, axis=0))
+
+        return EntryStore([self.elements[i] for i in columns], amounts[:, columns], self.energies[rows],
+                          self.entry_ids[rows], self.names[rows])
+
+    def get_pd_entries(self, rows=None):
+        """
+        PDEntry of each row (all of them by default), with the row as attribute
+        """
+        from pymatgen.analysis.phase_diagram import PDEntry
+        from pymatgen.core.composition import Composition
+
+        if rows is None:
+            rows = range(len(self))
+
+        pd_entries = []
+        for row in rows:
+            amounts = self.amounts[row]
+            composition = Composition({self.elements[i]: amounts[i] for i in np.flatnonzero(amounts)})
+            pd_entries.append(PDEntry(composition, float(self.energies[row]), name=str(self.names[row]),
+                                      attribute=int(row)))
+
+        return pd_entries
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class RunReport:
+    """
+    Wall time of each stage of a run and counters of the work done, e.g. entries processed
+    or hulls built. Timing a stage costs two perf_counter calls, so it can stay enabled.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager adding the time spent inside it to the stage name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += time.perf_counter() - start
+            stage["calls"] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        return {"stages": self.stages, "counters": self.counters}
+
+    def to_json(self, path=None):
+        """
+        :param path: file to write the report to. None only returns it
+        :return: report as a JSON string
+        """
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+
+        return text
+
+
+class ProgressMeter:
+    """
+    Rate and remaining time of a loop of known length, reported to a callback after each step
+    as callback(done, total, steps per second, ETA in seconds). Steps done before the meter
+    was created (e.g. resumed from a checkpoint) count as done but not in the rate.
+    """
+
+    def __init__(self, total, callback, done=0):
+        self.total = total
+        self.callback = callback
+        self.done = done
+        self.steps = 0
+        self.start = time.perf_counter()
+
+    def step(self):
+        self.done += 1
+        self.steps += 1
+        elapsed = time.perf_counter() - self.start
+        rate = self.steps / elapsed if elapsed > 0.0 else float("inf")
+        self.callback(self.done, self.total, rate, (self.total - self.done) / rate)
+
+
+def print_progress(done, total, rate, eta, stream=None):
+    """
+    Progress callback printing e.g. "12/40 intervals, 3.2 intervals/s, ETA 8.8 s" on a single line
+    :param stream: file written to. None writes to stderr
+    """
+    stream = stream if stream is not None else sys.stderr
+    stream.write("\r{}/{} intervals, {:.1f} intervals/s, ETA {:.1f} s".format(done, total, rate, eta))
+    if done == total:
+        stream.write("\n")
+    stream.flush()
+
+
+@contextmanager
+def profile(kind, output):
+    """
+    Profiles the code inside the context manager
+    :param kind: "cprofile" (stats written to output, readable with pstats or snakeviz),
+        "pyinstrument" (HTML written to output; pyinstrument must be installed) or None (no profiling)
+    :param output: file to write the profile to
+    """
+    if kind is None:
+        yield
+    elif kind == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output)
+    elif kind == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(output, "w") as f:
+                f.write(profiler.output_html())
+    else:
+        raise ValueError("kind must be 'cprofile', 'pyinstrument' or None, not '{}'".format(kind))
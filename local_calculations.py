@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from monty.json import MontyDecoder, MontyEncoder
+from pymatgen.apps.borg.hive import VaspToComputedEntryDrone
+from pymatgen.apps.borg.queen import BorgQueen
+
+
+class LocalCalculations:
+    """
+    Entries of the VASP calculations found under a root path. With a manifest, the path,
+    modification time and size of the files of each assimilated run are recorded together
+    with its entry, so that later scans only parse again the runs that changed.
+    """
+
+    def __init__(self, rootpath=".", manifest=None, number_of_drones=1, drone=None):
+        """
+        Local calculations constructor
+        :param rootpath: directory scanned recursively for calculations
+        :param manifest: JSON file in which the assimilated runs are recorded. None parses every
+            run on every scan, as BorgQueen does
+        :param number_of_drones: number of processes parsing the runs
+        :param drone: drone that parses the runs. Defaults to VaspToComputedEntryDrone
+        """
+        self.rootpath = rootpath
+        self.manifest = manifest
+        self.number_of_drones = number_of_drones
+        self.drone = drone if drone is not None else VaspToComputedEntryDrone()
+
+    @staticmethod
+    def get_signature(path):
+        """
+        Path, modification time and size of the files of a run
+        :param path: run directory or file
+        :return: sorted list of [file name, mtime, size]
+        """
+        if os.path.isfile(path):
+            filenames = [path]
+        else:
+            filenames = [os.path.join(path, f) for f in os.listdir(path)]
+
+        signature = []
+        for filename in sorted(filenames):
+            if os.path.isfile(filename):
+                stat = os.stat(filename)
+                signature.append([os.path.basename(filename), stat.st_mtime, stat.st_size])
+
+        return signature
+
+    def get_valid_paths(self):
+        valid_paths = []
+        for parent, subdirs, files in os.walk(self.rootpath):
+            valid_paths.extend(self.drone.get_valid_paths((parent, subdirs, files)))
+
+        return sorted(valid_paths)
+
+    def assimilate(self, paths):
+        if self.number_of_drones > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=self.number_of_drones) as executor:
+                return list(executor.map(self.drone.assimilate, paths))
+
+        return [self.drone.assimilate(path) for path in paths]
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest):
+            return {}
+
+        with open(self.manifest) as f:
+            return json.load(f)
+
+    def save_manifest(self, runs):
+        with open(self.manifest, "w") as f:
+            json.dump(runs, f, cls=MontyEncoder)
+
+    def get_data(self):
+        """
+        Entries of the calculations under the root path
+        :return: list of entries
+        """
+        if self.manifest is None:
+            queen = BorgQueen(self.drone, rootpath=self.rootpath, number_of_drones=self.number_of_drones)
+            return queen.get_data()
+
+        cached_runs = self.load_manifest()
+
+        runs = {}
+        changed_paths = []
+        for path in self.get_valid_paths():
+            signature = self.get_signature(path)
+            cached_run = cached_runs.get(path)
+            if cached_run is not None and cached_run["signature"] == signature:
+                runs[path] = cached_run
+            else:
+                runs[path] = {"signature": signature, "entry": None}
+                changed_paths.append(path)
+
+        for path, entry in zip(changed_paths, self.assimilate(changed_paths)):
+            runs[path]["entry"] = entry.as_dict() if entry is not None else None
+
+        self.save_manifest(runs)
+
+        decoder = MontyDecoder()
+        return [decoder.process_decoded(run["entry"]) for run in runs.values() if run["entry"] is not None]
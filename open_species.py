@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Elements to which a system can be open and the quantities their chemical potential can be
+plotted as: voltage for the alkali and alkaline earth metals, temperature for the diatomic
+gases (O2, N2, H2, each with its own Shomate coefficients), or the chemical potential itself.
+The reference chemical potential (zero of voltages and of -delta mu) is the energy per atom
+of the elemental ground state in the PhaseDiagram of the system, which the analyzer keeps as
+reference_chempot, so the conversions need no extra lookups or hard-coded energies. A
+conversion that needs the reference raises ValueError when it is not known.
+"""
+
+import warnings
+
+import numpy as np
+from thermodynamics import Thermodynamics
+
+
+class OpenSpecies:
+    """
+    Open element with its axis labels and chemical potential converters
+    """
+
+    def __init__(self, element, charge=None, gas=None, pressure=None):
+        """
+        Open species constructor
+        :param element: element symbol, e.g. "Li"
+        :param charge: charge z of the ion for voltages, V = -(mu - mu_ref)/z. None if no voltage is defined
+        :param gas: Thermodynamics options of the diatomic gas of the element (coefficients,
+            temperature_range, HrefMinusHo_kJmol). None if no temperature is defined
+        :param pressure: partial pressure of the gas in atm used for temperatures
+        """
+        self.element = element
+        self.charge = charge
+        self.gas = gas
+        self.pressure = pressure
+
+        self.labels = {}
+        if gas is not None:
+            self.labels['T_C'] = 'Temperature (°C)'
+            self.labels['T_K'] = 'Temperature (K)'
+            self.labels['None'] = r'-$\Delta$' + r'$\mu_{' + element + '}$ (eV)'
+        elif charge is not None:
+            ion = element + ('$^+$' if charge == 1 else '$^{{{}+}}$'.format(charge))
+            self.labels['V_' + element] = 'V vs. {}/{} (V)'.format(element, ion)
+            self.labels['None'] = r'$\mu_{' + element + '}$ vs. ' + element + '° (eV)'
+        else:
+            self.labels['None'] = r'$\mu_{' + element + '}$ (eV)'
+
+    @property
+    def conversions(self):
+        return tuple(self.labels)
+
+    def get_thermodynamics(self, reference):
+        """
+        Thermodynamics of the gas of the element
+        :param reference: chemical potential of the element per atom at 0 K
+        :return: Thermodynamics
+        """
+        if self.gas is None:
+            raise ValueError("{} is not a gas, so its chemical potential has no temperature".format(self.element))
+        if reference is None:
+            raise ValueError("The reference chemical potential of {} is not known".format(self.element))
+
+        thermodynamics = Thermodynamics(Ho_eV=2.0*reference, **self.gas)
+        thermodynamics.pressure = self.pressure
+
+        return thermodynamics
+
+    def convert(self, mu, conversion, reference=None, thermodynamics=None):
+        """
+        Converts chemical potentials of the element
+        :param mu: chemical potentials per atom, scalar or array
+        :param conversion: one of conversions, e.g. 'T_C', 'V_Li' or 'None'
+        :param reference: chemical potential of the elemental ground state. Only temperatures with a given
+            thermodynamics can be converted without it
+        :param thermodynamics: Thermodynamics for the temperatures. None uses get_thermodynamics(reference)
+        :return: array of converted values. Temperatures are rounded to 0.01 K; the ones the solver of
+            thermodynamics does not converge to are NaN, with a RuntimeWarning
+        """
+        mu = np.asarray(mu, dtype=float)
+        if conversion not in self.labels:
+            raise ValueError("{} cannot be converted to '{}', only to {}".format(
+                self.element, conversion, ", ".join(self.conversions)))
+
+        if conversion in ('T_C', 'T_K'):
+            if thermodynamics is None:
+                thermodynamics = self.get_thermodynamics(reference)
+            # Adjacent phases share their boundaries, so each distinct potential is solved once. An open
+            # lower bound (-inf) is an infinite temperature
+            unique, inverse = np.unique(mu, return_inverse=True)
+            finite = np.isfinite(unique)
+            temperature = np.where(unique < 0.0, np.inf, 0.0)
+            solved, converged = thermodynamics.mu_to_temperature_array(unique[finite])
+            if not converged.all():
+                warnings.warn("{} of {} chemical potentials of {} did not converge to a temperature and are "
+                              "NaN".format(np.count_nonzero(~converged), len(converged), self.element),
+                              RuntimeWarning)
+            temperature[finite] = np.where(converged, solved, np.nan)
+            temperature = temperature[inverse].reshape(mu.shape)
+            if conversion == 'T_C':
+                temperature = temperature - 273.0
+            return np.round(temperature, 2)
+
+        if reference is None:
+            raise ValueError("The reference chemical potential of {} is not known".format(self.element))
+        if conversion == 'None':
+            # -delta mu for gases, mu - mu_ref for metals
+            return reference - mu if self.gas is not None else mu - reference
+
+        return (reference - mu)/self.charge
+
+
+# Shomate coefficients A, B, C, D, E, F, G of the three temperature ranges, ranges in K and H(298.15 K) - H(0 K)
+# in kJ/mol. Source: https://webbook.nist.gov (N2: ID=C7727379, H2: ID=C1333740)
+NITROGEN = {
+    'coefficients': ((28.98641, 1.853978, -9.647459, 16.63537, 0.000117, -8.671914, 226.4168),
+                     (19.50583, 19.88705, -8.598535, 1.369784, 0.527601, -4.935202, 212.3900),
+                     (35.51872, 1.128728, -0.196103, 0.014662, -4.553760, -18.97091, 224.9810)),
+    'temperature_range': (100.0, 500.0, 2000.0, 6000.0),
+    'HrefMinusHo_kJmol': 8.670,
+}
+HYDROGEN = {
+    'coefficients': ((33.066178, -11.363417, 11.432816, -2.772874, -0.158558, -9.980797, 172.707974),
+                     (18.563083, 12.257357, -2.859786, 0.268238, 1.977990, -1.147438, 156.288133),
+                     (43.413560, -4.293079, 1.272428, -0.096876, -20.533862, -38.515158, 162.081354)),
+    'temperature_range': (298.0, 1000.0, 2500.0, 6000.0),
+    'HrefMinusHo_kJmol': 8.468,
+}
+
+# Registry of the supported open species
+OPEN_SPECIES = {species.element: species for species in (
+    OpenSpecies('O', gas={}, pressure=0.21),
+    OpenSpecies('Li', charge=1),
+    OpenSpecies('Na', charge=1),
+    OpenSpecies('K', charge=1),
+    OpenSpecies('Mg', charge=2),
+    OpenSpecies('N', gas=NITROGEN, pressure=0.78),
+    OpenSpecies('H', gas=HYDROGEN, pressure=1.0),
+)}
+
+
+def get_open_species(element):
+    """
+    :param element: element symbol
+    :return: OpenSpecies of the registry, or a generic one (chemical potential only) for other elements
+    """
+    if element in OPEN_SPECIES:
+        return OPEN_SPECIES[element]
+
+    return OpenSpecies(element)
+
+
+def find_open_species(conversion):
+    """
+    :param conversion: e.g. 'T_K' or 'V_Na'
+    :return: first OpenSpecies of the registry that can be converted to it, or None
+    """
+    for species in OPEN_SPECIES.values():
+        if conversion != 'None' and conversion in species.labels:
+            return species
+
+    return None
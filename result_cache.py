@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+# Directory of the on-disk caches (entries and results)
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "PlotPhaseStabilityRange")
+
+# Version of the stability range analysis. Bump it whenever get_phase_diagram_data changes its results,
+# so that results cached by older code are not used.
+RESULTS_VERSION = "1"
+
+# Defaults of the PhaseDiagramOpenAnalyzer options that are part of a request key. They are defined here,
+# not in PhaseDiagramOpen, so that a request key can be computed without importing pymatgen.
+DEFAULT_SWEEP = "grand_potential"
+DEFAULT_LOCAL_PATH = "."
+
+
+def get_pymatgen_version():
+    """
+    Version of pymatgen, read from its package metadata so that pymatgen is not imported
+    (pymatgen.__version__ is missing when it is a namespace package). '' if it is not installed.
+    importlib.metadata is new in Python 3.8; before it, the importlib_metadata backport or
+    pkg_resources (setuptools) is used
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+
+    if metadata is not None:
+        try:
+            return metadata.version("pymatgen")
+        except metadata.PackageNotFoundError:
+            return ""
+
+    import pkg_resources
+    try:
+        return pkg_resources.get_distribution("pymatgen").version
+    except pkg_resources.DistributionNotFound:
+        return ""
+
+
+class ResultCache:
+    """
+    Local on-disk cache of the results of PhaseDiagramOpenAnalyzer.get_phase_diagram_data.
+    Results are content addressed: their key is a hash of the processed entries, the open
+    element, the analysis options and RESULTS_VERSION, so a result is never used for other
+    entries. Each request (system, open element, options and local calculations) is also
+    recorded as an alias of the key of its result, so that repeating it, e.g. to plot the
+    same system with other axis settings, needs neither the entries, nor pymatgen, nor a scan
+    of the local calculations until the alias expires. Results are stored in SQLite as
+    compressed JSON and the least recently used ones are evicted beyond max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 ** 2, ttl=24 * 3600.0):
+        """
+        Result cache constructor
+        :param path: SQLite file. Defaults to results.sqlite in ~/.cache/PlotPhaseStabilityRange
+        :param max_bytes: maximum total size of the stored results
+        :param ttl: seconds after which a request alias expires, so that the entries are fetched (and the
+            result looked up by content) again. None never expires
+        """
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "results.sqlite")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, accessed REAL, size INTEGER, data BLOB)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS requests (request TEXT PRIMARY KEY, key TEXT, created REAL)")
+        self.connection.commit()
+
+    @staticmethod
+    def hash(*parts):
+        text = json.dumps([RESULTS_VERSION] + list(parts), sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    @staticmethod
+    def get_options(sweep, lower_bound):
+        """
+        Analysis options that may change a result: the sweep, the lower bound and the version of pymatgen
+        """
+        return {"sweep": sweep, "lower_bound": lower_bound, "pymatgen": get_pymatgen_version()}
+
+    @staticmethod
+    def get_result_key(entries, open_element, options):
+        """
+        Content key of a result
+        :param entries: processed entries the result is computed from
+        :param open_element: element to which the system is open
+        :param options: analysis options (see get_options)
+        """
+        entry_keys = sorted("{}|{}|{}|{!r}".format(getattr(entry, "entry_id", None), entry.name,
+                                                   entry.composition.formula, float(entry.energy))
+                            for entry in entries)
+
+        return ResultCache.hash(hashlib.sha1("\n".join(entry_keys).encode()).hexdigest(), open_element, options)
+
+    @staticmethod
+    def get_local_signature(local_path, local_manifest=None):
+        """
+        What a request key knows of the local calculations: their directory and, with a manifest, a hash
+        of the manifest, which records every assimilated run. The tree itself is not walked, so that
+        answering a request costs no scan; changes to it are seen once the request alias expires (ttl),
+        or as soon as a scan updates the manifest. None if local_path is None
+        """
+        if local_path is None:
+            return None
+
+        manifest = None
+        if local_manifest is not None:
+            try:
+                with open(local_manifest, "rb") as f:
+                    manifest = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                pass
+
+        return [os.path.abspath(local_path), manifest]
+
+    @staticmethod
+    def get_request_key(system, open_element, options, local_path=None, local_manifest=None):
+        """
+        Key of a request, computed without the entries
+        :param system: elements of the system
+        :param open_element: element to which the system is open
+        :param options: analysis options (see get_options)
+        :param local_path: directory of the local calculations added to the entries, or None
+        :param local_manifest: manifest of the local calculations (see LocalCalculations), or None
+        """
+        chemsys = "-".join(sorted(set(str(el) for el in system)))
+
+        return ResultCache.hash(chemsys, open_element, options,
+                                ResultCache.get_local_signature(local_path, local_manifest))
+
+    @staticmethod
+    def get_analysis_request_key(system, open_element, sweep=DEFAULT_SWEEP, lower_bound=None,
+                                 local_path=DEFAULT_LOCAL_PATH, local_manifest=None, **analyzer_options):
+        """
+        Key of a request of PhaseDiagramOpenAnalyzer.get_phase_diagram_data, from the options of the analyzer
+        :param system: elements of the system
+        :param open_element: element to which the system is open
+        :param sweep, lower_bound, local_path, local_manifest: options of the analyzer that change its result
+        :param analyzer_options: the other options of the analyzer, e.g. workers or report, which do not
+        """
+        return ResultCache.get_request_key(system, open_element, ResultCache.get_options(sweep, lower_bound),
+                                           local_path, local_manifest)
+
+    @staticmethod
+    def encode(ranges, reference_chempot):
+        return zlib.compress(json.dumps({"ranges": ranges, "reference_chempot": reference_chempot}).encode())
+
+    @staticmethod
+    def decode(data):
+        result = json.loads(zlib.decompress(data).decode())
+        return result["ranges"], result["reference_chempot"]
+
+    def get(self, key):
+        """
+        :param key: content key (see get_result_key)
+        :return: (dict of phase -> stability windows, reference chemical potential), or None if not cached
+        """
+        row = self.connection.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+
+        return self.decode(row[0])
+
+    def put(self, key, ranges, reference_chempot):
+        """
+        Stores a result, evicting the least recently used ones beyond max_bytes
+        """
+        data = self.encode(ranges, reference_chempot)
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                (key, time.time(), len(data), data))
+
+        if self.max_bytes is not None:
+            total = 0
+            evicted = []
+            for old_key, size in self.connection.execute("SELECT key, size FROM results ORDER BY accessed DESC"):
+                total += size
+                if total > self.max_bytes:
+                    evicted.append((old_key,))
+            self.connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.connection.commit()
+
+    def get_request(self, request):
+        """
+        :param request: request key (see get_request_key)
+        :return: result of the request, or None if it was not recorded, has expired or was evicted
+        """
+        row = self.connection.execute("SELECT key, created FROM requests WHERE request = ?", (request,)).fetchone()
+        if row is None or self.ttl is not None and time.time() - row[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        return self.get(row[0])
+
+    def put_request(self, request, key):
+        """
+        Records key as the result of request
+        """
+        now = time.time()
+        self.connection.execute("INSERT OR REPLACE INTO requests VALUES (?, ?, ?)", (request, key, now))
+        if self.ttl is not None:
+            self.connection.execute("DELETE FROM requests WHERE created < ?", (now - self.ttl,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
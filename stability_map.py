@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stability maps of a system open to oxygen over a grid of temperatures and oxygen
+partial pressures. The oxygen chemical potential of the whole grid is computed with
+vectorized Thermodynamics calls, and each cell is labeled with its set of stable phases
+by searching the transition chemical potentials of a single PhaseDiagram, so no hull is
+built per cell.
+
+Usage: python stability_map.py --system Li-Ca-O --output LiCaO_map.png
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+from open_species import OPEN_SPECIES
+from thermodynamics import Thermodynamics
+
+
+def get_oxygen_chempot_grid(temperatures, pressures, thermodynamics=None):
+    """
+    Oxygen chemical potential (per O atom, as in the phase diagrams) on a T x p(O2) grid
+    :param temperatures: temperatures in K
+    :param pressures: oxygen partial pressures in atm
+    :param thermodynamics: Thermodynamics of oxygen gas. Defaults to Thermodynamics()
+    :return: array of shape (len(pressures), len(temperatures))
+    """
+    if thermodynamics is None:
+        thermodynamics = Thermodynamics()
+    temperatures = np.asarray(temperatures, dtype=float)
+    pressures = np.asarray(pressures, dtype=float)
+
+    # H and S of the O2 molecule are computed once per temperature and broadcast over the pressures
+    mu_O2 = thermodynamics.temperature_to_mu_array(temperatures[np.newaxis, :], pressures[:, np.newaxis])
+
+    return mu_O2/2.0
+
+
+def label_chempots(mu, chempots):
+    """
+    Interval of transition chemical potentials in which each chemical potential lies
+    :param mu: array of chemical potentials
+    :param chempots: transition chemical potentials, in decreasing order
+    :return: int array with the index of the interval below chempots[i], or -1 above chempots[0]
+    """
+    ascending = np.asarray(chempots, dtype=float)[::-1]
+
+    return len(chempots) - 1 - np.searchsorted(ascending, mu, side='left')
+
+
+class StabilityMap:
+    """
+    Stable phases on a grid of temperatures and oxygen partial pressures
+    """
+
+    def __init__(self, temperatures, pressures, mu, labels, phase_sets):
+        """
+        Stability map constructor
+        :param temperatures: temperatures in K
+        :param pressures: oxygen partial pressures in atm
+        :param mu: oxygen chemical potential of each cell, shape (len(pressures), len(temperatures))
+        :param labels: index in phase_sets of the stable phases of each cell; -1 where no phase set is known
+        :param phase_sets: tuple of stable phases of each label
+        """
+        self.temperatures = temperatures
+        self.pressures = pressures
+        self.mu = mu
+        self.labels = labels
+        self.phase_sets = phase_sets
+
+    def get_phases(self, temperature_index, pressure_index):
+        label = self.labels[pressure_index, temperature_index]
+        return self.phase_sets[label] if label >= 0 else ()
+
+    def plot(self, mode='heatmap', output=None, dpi=115):
+        """
+        Plots the map with temperature on the X axis and log p(O2) on the Y axis
+        :param mode: 'heatmap' (one colored cell per grid point) or 'contour' (filled regions
+            with their boundaries)
+        :param output: image file. If given, the figure is rendered with the Agg backend and saved;
+            otherwise it is shown
+        :param dpi: resolution of the figure
+        """
+        import matplotlib
+        if output is not None:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        # Only the phase sets present on the grid get a color
+        present = np.unique(self.labels[self.labels >= 0])
+        colors = np.searchsorted(present, self.labels).astype(float)
+        colors[self.labels < 0] = np.nan
+        cmap = plt.get_cmap('tab20', max(len(present), 1))
+
+        fig, ax = plt.subplots(figsize=(7, 4.5), dpi=dpi)
+        if mode == 'contour':
+            levels = np.arange(len(present) + 1) - 0.5
+            image = ax.contourf(self.temperatures, self.pressures, colors, levels=levels, cmap=cmap)
+            ax.contour(self.temperatures, self.pressures, colors, levels=levels, colors='k', linewidths=0.5)
+        elif mode == 'heatmap':
+            image = ax.pcolormesh(self.temperatures, self.pressures, colors, cmap=cmap,
+                                  vmin=-0.5, vmax=len(present) - 0.5, shading='nearest')
+        else:
+            raise ValueError("mode must be 'heatmap' or 'contour', not '{}'".format(mode))
+
+        ax.set_yscale('log')
+        ax.set_xlabel('Temperature (K)')
+        ax.set_ylabel(r'$p_{O_2}$ (atm)')
+        colorbar = fig.colorbar(image, ax=ax, ticks=np.arange(len(present)))
+        colorbar.ax.set_yticklabels([' + '.join(self.phase_sets[label]) for label in present], fontsize=8)
+
+        if output is not None:
+            fig.savefig(output, dpi=dpi, bbox_inches='tight')
+            plt.close(fig)
+        else:
+            plt.show()
+
+
+def get_stability_map(analyzer, temperatures, pressures, entries=None, thermodynamics=None):
+    """
+    Stable phases of a system open to oxygen on a T x p(O2) grid
+    :param analyzer: PhaseDiagramOpenAnalyzer with open_element "O"
+    :param temperatures: temperatures in K
+    :param pressures: oxygen partial pressures in atm
+    :param entries: processed entries of the system. None gets them with the analyzer
+    :param thermodynamics: Thermodynamics of oxygen gas. Defaults to the one referenced to the
+        oxygen ground state of the system
+    :return: StabilityMap
+    """
+    if analyzer.open_element != "O":
+        raise ValueError("Stability maps need a system open to O, not to '{}'".format(analyzer.open_element))
+
+    chempots, interval_data = analyzer.get_interval_data(entries)
+    phase_sets = [tuple(sorted(phases)) for phases, chempot in interval_data]
+    if thermodynamics is None:
+        thermodynamics = OPEN_SPECIES["O"].get_thermodynamics(analyzer.reference_chempot)
+
+    mu = get_oxygen_chempot_grid(temperatures, pressures, thermodynamics)
+    labels = label_chempots(mu, chempots)
+
+    return StabilityMap(np.asarray(temperatures, dtype=float), np.asarray(pressures, dtype=float),
+                        mu, labels, phase_sets)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stable phases on a temperature x oxygen pressure grid')
+    parser.add_argument('--system', default='Li-Ca-O', help="elements of the system, e.g. 'Li-Ca-O'")
+    parser.add_argument('--tmin', type=float, default=300.0, help='K')
+    parser.add_argument('--tmax', type=float, default=2000.0, help='K')
+    parser.add_argument('--nt', type=int, default=400, help='number of temperatures')
+    parser.add_argument('--pmin', type=float, default=1.0e-20, help='atm')
+    parser.add_argument('--pmax', type=float, default=1.0, help='atm')
+    parser.add_argument('--np', type=int, default=200, help='number of pressures (log spaced)')
+    parser.add_argument('--mode', default='heatmap', choices=['heatmap', 'contour'])
+    parser.add_argument('--output', default=None, help='save the figure to this file instead of showing it')
+    parser.add_argument('--sweep', default='facets', choices=['grand_potential', 'facets'])
+    parser.add_argument('--local-path', default=None, help='directory with local VASP calculations')
+    parser.add_argument('--api-key', default=None, help='Materials Project API key')
+    args = parser.parse_args(argv)
+
+    if args.output is not None:
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    analyzer = PhaseDiagramOpenAnalyzer(system=args.system.split('-'), open_element='O', sweep=args.sweep,
+                                        local_path=args.local_path, api_key=args.api_key)
+    temperatures = np.linspace(args.tmin, args.tmax, args.nt)
+    pressures = np.logspace(math.log10(args.pmin), math.log10(args.pmax), args.np)
+
+    stability_map = get_stability_map(analyzer, temperatures, pressures)
+    stability_map.plot(args.mode, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+
+class StabilityRangeTable:
+    """
+    Columnar stability ranges: one row per (system, phase, initial chemical potential,
+    final chemical potential). A phase stable in separate windows has one row per window.
+    Systems and phase formulas are kept once in string tables and referenced from the rows
+    by integer ids, so large screening outputs stay compact and can be saved as .npz or as
+    one memory-mapped .npy file per column.
+    """
+
+    columns = ("system_ids", "phase_ids", "mu_start", "mu_end")
+
+    def __init__(self, system_ids, phase_ids, mu_start, mu_end, systems, formulas, references=None):
+        """
+        Table constructor
+        :param system_ids: index in systems of the system of each row
+        :param phase_ids: index in formulas of the phase of each row
+        :param mu_start: chemical potential at which the phase becomes stable
+        :param mu_end: chemical potential at which the phase stops being stable
+        :param systems: string table of systems, e.g. "Li-Ca-O:O"
+        :param formulas: string table of phase formulas
+        :param references: chemical potential of the elemental ground state of the open element in
+            each system (the zero of voltages and of -delta mu), NaN where it is not known
+        """
+        self.system_ids = system_ids
+        self.phase_ids = phase_ids
+        self.mu_start = mu_start
+        self.mu_end = mu_end
+        self.systems = np.asarray(systems, dtype=str)
+        self.formulas = np.asarray(formulas, dtype=str)
+        if references is None:
+            references = np.full(len(self.systems), np.nan)
+        self.references = np.asarray(references, dtype=float)
+
+    def __len__(self):
+        return len(self.phase_ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Table from rows (system, open element, phase, initial chemical potential, final chemical potential,
+        reference chemical potential of the open element), as written by batch.analyze_systems
+        """
+        systems = {}
+        references = []
+        formulas = {}
+        system_ids = []
+        phase_ids = []
+        mu_start = []
+        mu_end = []
+        for system, open_element, phase, start, end, reference in rows:
+            label = "{}:{}".format(system, open_element)
+            if label not in systems:
+                systems[label] = len(systems)
+                references.append(reference)
+            system_ids.append(systems[label])
+            phase_ids.append(formulas.setdefault(phase, len(formulas)))
+            mu_start.append(start)
+            mu_end.append(end)
+
+        return cls(np.array(system_ids, dtype=np.int32), np.array(phase_ids, dtype=np.int32),
+                   np.array(mu_start, dtype=float), np.array(mu_end, dtype=float),
+                   list(systems), list(formulas), references)
+
+    @classmethod
+    def from_dict(cls, ranges, system="", reference=np.nan):
+        """
+        Table from the dict returned by PhaseDiagramOpenAnalyzer.get_phase_diagram_data
+        :param ranges: dict of phase -> list of [initial chemical potential, final chemical potential] windows
+        :param system: label of the system, e.g. "Li-Ca-O:O"
+        :param reference: reference chemical potential of the open element (analyzer.reference_chempot)
+        """
+        phase_ids = [phase_id for phase_id, windows in enumerate(ranges.values()) for _ in windows]
+        windows = [window for windows in ranges.values() for window in windows]
+
+        return cls(np.zeros(len(phase_ids), dtype=np.int32), np.array(phase_ids, dtype=np.int32),
+                   np.array([w[0] for w in windows], dtype=float),
+                   np.array([w[1] for w in windows], dtype=float),
+                   [system], list(ranges), [reference])
+
+    def to_dict(self):
+        """
+        :return: dict of phase -> list of [initial chemical potential, final chemical potential] windows
+        """
+        ranges = {}
+        for phase, start, end in zip(self.phases, self.mu_start.tolist(), self.mu_end.tolist()):
+            ranges.setdefault(phase, []).append([start, end])
+
+        return ranges
+
+    @property
+    def phases(self):
+        """
+        Formula of the phase of each row
+        """
+        return self.formulas[np.asarray(self.phase_ids)].tolist()
+
+    def get_reference(self, system):
+        """
+        :return: reference chemical potential of the open element in system, or None if it is not known
+        """
+        system_id = self.get_id(self.systems, system)
+        if system_id < 0 or np.isnan(self.references[system_id]):
+            return None
+        return float(self.references[system_id])
+
+    @staticmethod
+    def get_id(strings, value):
+        """
+        :return: index of value in the string table, or -1 if it is not there
+        """
+        ids = np.flatnonzero(strings == value)
+        return ids[0] if len(ids) else -1
+
+    def select(self, system=None, phase=None):
+        """
+        Rows of one system and/or phase. On memory-mapped tables only the id columns are read
+        to find them
+        :param system: system label, e.g. "Li-Ca-O:O"
+        :param phase: phase formula
+        :return: StabilityRangeTable with the selected rows
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if system is not None:
+            mask &= np.asarray(self.system_ids) == self.get_id(self.systems, system)
+        if phase is not None:
+            mask &= np.asarray(self.phase_ids) == self.get_id(self.formulas, phase)
+        rows = np.flatnonzero(mask)
+
+        return StabilityRangeTable(self.system_ids[rows], self.phase_ids[rows], self.mu_start[rows],
+                                   self.mu_end[rows], self.systems, self.formulas, self.references)
+
+    def save_npz(self, path):
+        np.savez_compressed(path, systems=self.systems, formulas=self.formulas, references=self.references,
+                            **{column: getattr(self, column) for column in self.columns})
+
+    @classmethod
+    def load_npz(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[column] for column in cls.columns), data["systems"], data["formulas"],
+                       data["references"])
+
+    def save(self, directory):
+        """
+        Saves each column and string table as a .npy file in directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        for column in self.columns + ("systems", "formulas", "references"):
+            np.save(os.path.join(directory, column + ".npy"), getattr(self, column))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads a table saved with save. The columns are memory-mapped by default, so that
+        only the rows that are used are read from disk
+        """
+        columns = [np.load(os.path.join(directory, column + ".npy"), mmap_mode=mmap_mode)
+                   for column in cls.columns]
+        tables = [np.load(os.path.join(directory, name + ".npy")) for name in ("systems", "formulas", "references")]
+
+        return cls(*columns, *tables)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+
+class SweepCheckpoint:
+    """
+    Checkpoint file of a chemical potential sweep, so that an interrupted run resumes from the
+    intervals it had completed. It is a JSON lines file: a header with the key of the sweep
+    (entries, open element and options) and its number of intervals, then one line per
+    completed interval with its index and stable phases, flushed as soon as it is known.
+    A file written for another sweep is started again, and a line cut short by the
+    interruption is dropped.
+    """
+
+    def __init__(self, path, key, intervals):
+        """
+        Sweep checkpoint constructor. Reads the intervals already recorded and reopens the file for the new ones
+        :param path: checkpoint file
+        :param key: key of the sweep (see ResultCache.get_result_key)
+        :param intervals: number of intervals of the sweep
+        """
+        self.path = path
+        self.header = {"key": key, "intervals": intervals}
+        self.done = self.read()
+
+        # The file is written again with the valid lines only, so that new lines are not appended to a cut one
+        self.file = open(path, "w")
+        self.file.write(json.dumps(self.header) + "\n")
+        for index, phases in sorted(self.done.items()):
+            self.file.write(json.dumps({"index": index, "phases": phases}) + "\n")
+        self.file.flush()
+
+    def read(self):
+        """
+        :return: dict of interval index -> stable phases recorded for this sweep. Empty if the file
+            does not exist or belongs to another sweep
+        """
+        try:
+            with open(self.path) as f:
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return {}
+
+        try:
+            if json.loads(lines[0]) != self.header:
+                return {}
+        except ValueError:
+            return {}
+
+        done = {}
+        for line in lines[1:]:
+            try:
+                interval = json.loads(line)
+            except ValueError:
+                continue
+            done[interval["index"]] = interval["phases"]
+
+        return done
+
+    def record(self, index, phases):
+        """
+        Records the stable phases of a completed interval
+        """
+        self.done[index] = phases
+        self.file.write(json.dumps({"index": index, "phases": phases}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
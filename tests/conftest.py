@@ -0,0 +1,23 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The modules of the repository are top level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def entries():
+    """
+    Small hand-written set of Materials Project-like ComputedEntry objects of the Ca-Li-O system,
+    standing in for a download. Their parameters (GGA run, PBE POTCARs) are the ones the
+    Materials Project compatibility schemes check, so the schemes keep all of them
+    """
+    from monty.json import MontyDecoder
+
+    with open(os.path.join(FIXTURES, "entries_Ca-Li-O.json")) as f:
+        return MontyDecoder().process_decoded(json.load(f))
@@ -0,0 +1,62 @@
+from concurrent.futures import Future
+
+import pytest
+
+import batch
+from entry_cache import EntryCache
+from entry_fetcher import EntryFetcher
+from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+from stability_ranges import StabilityRangeTable
+
+# Li2O and CaLi2O2 come from the local calculations, the other entries from the Materials Project
+LOCAL_IDS = ("mp-4", "mp-8")
+
+
+class FixtureFetcher:
+    """
+    Stands in for EntryFetcher, answering every download at once with the entries of the system
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.fetched = []
+
+    def fetch(self, system):
+        self.fetched.append(EntryFetcher.get_chemsys(system))
+        future = Future()
+        future.set_result(batch.slice_entries(self.entries, system))
+        return future
+
+    def get_entries(self, system):
+        return self.fetch(system).result()
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_separate_systems_scan_the_local_calculations_once(tmp_path, entries, monkeypatch):
+    scans = []
+
+    def get_local_entries(analyzer):
+        scans.append(analyzer.local_path)
+        return [entry for entry in entries if entry.entry_id in LOCAL_IDS]
+
+    monkeypatch.setattr(PhaseDiagramOpenAnalyzer, "get_local_entries", get_local_entries)
+    fetcher = FixtureFetcher([entry for entry in entries if entry.entry_id not in LOCAL_IDS])
+    cache = EntryCache(tmp_path / "entries.sqlite")
+    jobs = [(["Ca", "Li", "O"], "O"), (["Li", "O"], "O"), (["Ca", "O"], "O")]
+
+    rows = list(batch.analyze_systems(jobs, entry_cache=cache, local_path=str(tmp_path), fetcher=fetcher))
+
+    assert scans == [str(tmp_path)]
+    assert sorted(set(fetcher.fetched)) == ["Ca-Li-O", "Ca-O", "Li-O"]
+    phases = {system: set(row[2] for row in rows if row[0] == system) for system in ("Ca-Li-O", "Li-O", "Ca-O")}
+    assert "Li2O" in phases["Li-O"] and "Li2O" in phases["Ca-Li-O"]
+    assert not phases["Ca-O"] & {"Li2O", "CaLi2O2"}
+    # Rows carry the reference of their system, the energy per atom of O2
+    o2 = next(entry for entry in entries if entry.entry_id == "mp-3")
+    assert StabilityRangeTable.from_rows(rows).get_reference("Li-O:O") == pytest.approx(o2.energy_per_atom)
+
+    # Cached under the name of the compatibility scheme of the analyzer, so a second run downloads nothing
+    assert cache.contains(["Ca", "Li", "O"], PhaseDiagramOpenAnalyzer.compatibility.__name__)
+    fetcher.fetched = []
+    assert list(batch.analyze_systems(jobs, entry_cache=cache, local_path=str(tmp_path), fetcher=fetcher)) == rows
+    assert fetcher.fetched == []
@@ -0,0 +1,34 @@
+"""
+pytest-benchmark suite of the hot paths, with the cases of benchmark.py. Run it and keep the results as a
+baseline, then compare a later run with it:
+
+    pytest tests/test_benchmarks.py --benchmark-autosave
+    pytest tests/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:10%
+
+The rest of the tests can skip it with --benchmark-skip.
+"""
+
+import pytest
+
+import benchmark as suite
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("name", list(suite.get_thermodynamics_cases()))
+def test_thermodynamics(benchmark, name):
+    benchmark.group = "thermodynamics"
+    benchmark(suite.get_thermodynamics_cases()[name])
+
+
+@pytest.mark.parametrize("name, elements, number_of_entries, sweep", suite.get_phase_diagram_cases(),
+                         ids=[case[0] for case in suite.get_phase_diagram_cases()])
+def test_phase_diagram(benchmark, name, elements, number_of_entries, sweep):
+    benchmark.group = "phase_diagram/{}-component".format(len(elements))
+    benchmark.pedantic(suite.get_phase_diagram_function(elements, number_of_entries, sweep), rounds=3)
+
+
+@pytest.mark.parametrize("name", ["render/plot_stability_range/20", "render/StabilityRangeRenderer/20"])
+def test_rendering(benchmark, name, tmp_path):
+    benchmark.group = "rendering"
+    benchmark.pedantic(suite.get_rendering_cases(str(tmp_path))[name], rounds=3)
@@ -0,0 +1,115 @@
+import copy
+import json
+import time
+
+import pytest
+
+from entry_cache import EntryCache
+
+COMPATIBILITY = "MaterialsProjectCompatibility"
+
+
+def get_ids(entries):
+    return sorted(entry.entry_id for entry in entries)
+
+
+def test_subsystem_is_answered_from_cached_superset(tmp_path, entries):
+    cache = EntryCache(tmp_path / "entries.sqlite")
+    cache.put(["Ca", "Li", "O"], COMPATIBILITY, entries)
+
+    # Li, O2, Li2O and Li2O2
+    assert get_ids(cache.get(["O", "Li"], COMPATIBILITY)) == ["mp-1", "mp-3", "mp-4", "mp-5"]
+    assert len(cache.get(["Li", "Ca", "O"], COMPATIBILITY)) == len(entries)
+    assert cache.get(["Li", "Fe", "O"], COMPATIBILITY) is None
+    assert cache.get(["Li", "O"], "OtherCompatibility") is None
+    assert cache.contains(["Li", "O"], COMPATIBILITY)
+    assert not cache.contains(["Li", "Fe", "O"], COMPATIBILITY)
+
+
+def test_expired_systems_are_fetched_again(tmp_path, entries, monkeypatch):
+    cache = EntryCache(tmp_path / "entries.sqlite", ttl=60.0)
+    cache.put(["Ca", "Li", "O"], COMPATIBILITY, entries)
+    assert cache.get(["Li", "O"], COMPATIBILITY) is not None
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61.0)
+    assert cache.get(["Li", "O"], COMPATIBILITY) is None
+
+    fetched = []
+    cache.get_or_fetch(["Li", "O"], COMPATIBILITY, lambda: fetched.append(1) or entries[:1])
+    assert fetched == [1]
+
+
+def test_get_or_fetch_downloads_once(tmp_path, entries):
+    cache = EntryCache(tmp_path / "entries.sqlite")
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return entries
+
+    for _ in range(2):
+        assert len(cache.get_or_fetch(["Ca", "Li", "O"], COMPATIBILITY, fetch)) == len(entries)
+    assert fetched == [1]
+
+
+def test_offline_cache_raises_lookup_error(tmp_path, entries):
+    cache = EntryCache(tmp_path / "entries.sqlite", offline=True)
+    cache.put(["Li", "O"], COMPATIBILITY, entries[:1])
+
+    with pytest.raises(LookupError):
+        cache.get_or_fetch(["Ca", "Li", "O"], COMPATIBILITY, lambda: pytest.fail("an offline cache downloaded"))
+    assert len(cache.get_or_fetch(["Li", "O"], COMPATIBILITY, lambda: [])) == 1
+
+
+def test_corrections_are_reused(tmp_path, entries):
+    cache = EntryCache(tmp_path / "entries.sqlite")
+    processed = []
+
+    # Corrects every entry but O2, which is incompatible
+    def process_entry(entry):
+        processed.append(entry.entry_id)
+        if entry.entry_id == "mp-3":
+            return None
+        entry.correction = -0.1*entry.composition.num_atoms
+        return entry
+
+    first = cache.process_entries(entries, "Scheme-1", process_entry)
+    assert len(processed) == len(entries)
+    assert get_ids(first) == get_ids(entry for entry in entries if entry.entry_id != "mp-3")
+    energies = [entry.energy for entry in first]
+
+    for entry in entries:
+        entry.correction = 0.0
+    second = cache.process_entries(entries, "Scheme-1", process_entry)
+    assert len(processed) == len(entries)
+    assert cache.correction_hits == len(entries)
+    assert [entry.energy for entry in second] == energies
+
+    cache.process_entries(entries, "Scheme-2", process_entry)
+    assert len(processed) == 2*len(entries)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_cached_corrections_match_materials_project_compatibility(tmp_path, entries, capsys):
+    from pymatgen.entries.compatibility import MaterialsProjectCompatibility
+
+    compat = MaterialsProjectCompatibility()
+    expected = compat.process_entries(copy.deepcopy(entries))
+    cache = EntryCache(tmp_path / "entries.sqlite")
+    cache.process_entries(copy.deepcopy(entries), "MaterialsProjectCompatibility-test", compat.process_entry)
+    cached = cache.process_entries(copy.deepcopy(entries), "MaterialsProjectCompatibility-test", compat.process_entry)
+
+    assert cache.correction_hits == len(entries)
+    assert get_ids(cached) == get_ids(expected)
+    for entry, reference in zip(cached, expected):
+        assert entry.energy == pytest.approx(reference.energy, abs=1.0e-12)
+        # The itemized corrections survive the cache, not only their sum (JSON, as NaN uncertainties are not ==)
+        if hasattr(reference, "energy_adjustments"):
+            assert json.dumps([adjustment.as_dict() for adjustment in entry.energy_adjustments]) == \
+                json.dumps([adjustment.as_dict() for adjustment in reference.energy_adjustments])
+
+        compat.explain(entry)
+        explanation = capsys.readouterr().out
+        compat.explain(reference)
+        assert explanation == capsys.readouterr().out
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from entry_fetcher import EntryFetcher
+
+
+class StubRester:
+    """
+    Stands in for MPRester: returns the chemical system as its only "entry" after a short delay,
+    failing the first failures requests of each system with error
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def get_entries_in_chemsys(self, elements, compatible_only=True):
+        return self.server.request("-".join(elements))
+
+
+class StubServer:
+    def __init__(self, delay=0.05, failures=0, error=ConnectionError):
+        self.delay = delay
+        self.failures = failures
+        self.error = error
+        self.lock = threading.Lock()
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+
+    def request(self, chemsys):
+        with self.lock:
+            self.requests.append(chemsys)
+            attempt = self.requests.count(chemsys)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            if attempt <= self.failures:
+                raise self.error("stub failure of {}".format(chemsys))
+            return [chemsys]
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def get_fetcher(self, **kwargs):
+        return EntryFetcher(rester_factory=lambda: StubRester(self), backoff=0.0, **kwargs)
+
+
+def test_downloads_run_concurrently_up_to_the_limit():
+    server = StubServer()
+    systems = [["Li", el, "O"] for el in ("Ca", "Fe", "Mn", "Co", "Ni", "Cu", "Zn", "Ti")]
+
+    with server.get_fetcher(max_concurrency=3) as fetcher:
+        results = fetcher.fetch_many(systems)
+
+        assert results == [[fetcher.get_chemsys(system)] for system in systems]
+        assert server.max_running == 3
+        assert len(fetcher.resters) == 3
+
+
+def test_requests_for_the_same_system_share_one_download():
+    server = StubServer()
+
+    with server.get_fetcher() as fetcher:
+        first = fetcher.fetch(["Li", "Ca", "O"])
+        second = fetcher.fetch(["O", "Ca", "Li"])
+
+        assert first is second
+        assert second.result() == ["Ca-Li-O"]
+        assert fetcher.get_entries(["Ca", "O", "Li"]) == ["Ca-Li-O"]
+        assert server.requests == ["Ca-Li-O"]
+        assert fetcher.coalesced == 2
+
+
+def test_failed_requests_are_retried():
+    server = StubServer(failures=2)
+
+    with server.get_fetcher(retries=3) as fetcher:
+        assert fetcher.get_entries(["Li", "O"]) == ["Li-O"]
+        assert fetcher.requests == 3
+        assert fetcher.retried == 2
+
+
+def test_failed_downloads_are_not_kept():
+    server = StubServer(failures=2)
+
+    with server.get_fetcher(retries=1) as fetcher:
+        with pytest.raises(ConnectionError):
+            fetcher.get_entries(["Li", "O"])
+        assert fetcher.get_entries(["Li", "O"]) == ["Li-O"]
+        assert len(server.requests) == 3
+
+
+class MPRestError(Exception):
+    pass
+
+
+def wrapped_connection_error(message):
+    # MPRester raises MPRestError from the exception of the failed request
+    error = MPRestError(message)
+    error.__cause__ = ConnectionError(message)
+    return error
+
+
+def test_only_transient_errors_are_retried():
+    server = StubServer(failures=1, error=ValueError)
+
+    with server.get_fetcher(retries=3) as fetcher:
+        with pytest.raises(ValueError):
+            fetcher.get_entries(["Li", "O"])
+        assert fetcher.requests == 1
+
+    server = StubServer(failures=2, error=wrapped_connection_error)
+
+    with server.get_fetcher(retries=3) as fetcher:
+        assert fetcher.get_entries(["Li", "O"]) == ["Li-O"]
+        assert fetcher.retried == 2
+
+
+class ThermoHandler(BaseHTTPRequestHandler):
+    """
+    Answers the materials/thermo route of the Materials Project API, queried by MPRester.get_entries_in_chemsys,
+    with the entries of the server in the requested chemical systems. Connections are kept alive
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        # Single elements are queried by formula
+        chemsys = set(query.get("chemsys", query.get("formula"))[0].split(","))
+        data = [{"entries": {"GGA": entry.as_dict()}} for entry in self.server.entries
+                if EntryFetcher.get_chemsys(el.symbol for el in entry.composition.elements) in chemsys]
+        body = json.dumps({"data": data}).encode()
+        with self.server.lock:
+            self.server.clients.append(self.client_address)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_threads_reuse_the_connection_of_their_mprester(entries):
+    from pymatgen.ext.matproj import MPRester
+    if not hasattr(MPRester, "request"):
+        pytest.skip("the stub server answers the routes of the current Materials Project API only")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThermoHandler)
+    server.entries = entries
+    server.lock = threading.Lock()
+    server.clients = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def rester_factory():
+        rester = MPRester("0" * 32)
+        rester.preamble = "http://127.0.0.1:{}/".format(server.server_address[1])
+        return rester
+
+    systems = [["Li", "O"], ["Ca", "O"], ["Ca", "Li"], ["Ca", "Li", "O"], ["Li"], ["O"]]
+    try:
+        with EntryFetcher(max_concurrency=2, rester_factory=rester_factory) as fetcher:
+            results = fetcher.fetch_many(systems)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for system, result in zip(systems, results):
+        assert sorted(entry.entry_id for entry in result) == sorted(
+            entry.entry_id for entry in entries if set(el.symbol for el in entry.composition.elements) <= set(system))
+    # Every request of a thread goes through the connection of its MPRester session
+    assert len(server.clients) == len(systems)
+    assert len(set(server.clients)) == 2
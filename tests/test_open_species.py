@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from open_species import OPEN_SPECIES, get_open_species
+from stability_ranges import StabilityRangeTable
+
+ROWS = [("Li-Ca-O", "O", "CaO", -4.9, -np.inf, -4.9),
+        ("Li-Ca-O", "O", "Li2O2", -4.9, -5.6, -4.9),
+        ("Li-Fe-P-O", "Li", "LiFePO4", -1.9, -5.3, -1.9),
+        ("K-O", "K", "K2O", -1.1, -np.inf, -1.1)]
+
+
+def test_batch_rows_keep_the_reference_of_each_system():
+    table = StabilityRangeTable.from_rows(ROWS)
+
+    assert table.systems.tolist() == ["Li-Ca-O:O", "Li-Fe-P-O:Li", "K-O:K"]
+    assert table.get_reference("Li-Fe-P-O:Li") == -1.9
+    assert table.get_reference("K-O:K") == -1.1
+    rows = table.select(system="Li-Fe-P-O:Li")
+    np.testing.assert_allclose(OPEN_SPECIES["Li"].convert(rows.mu_end, "V_Li", rows.get_reference("Li-Fe-P-O:Li")),
+                               [3.4])
+
+
+@pytest.mark.parametrize("element, conversion", [("Li", "V_Li"), ("K", "V_K"), ("O", "T_K"), ("Fe", "None")])
+def test_conversions_without_reference_raise(element, conversion):
+    table = StabilityRangeTable(np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.int32), np.array([-2.0]),
+                                np.array([-3.0]), ["X:{}".format(element)], ["X"])
+    assert table.get_reference("X:{}".format(element)) is None
+
+    with pytest.raises(ValueError):
+        get_open_species(element).convert(table.mu_start, conversion, table.get_reference("X:{}".format(element)))
+
+
+def test_temperatures_that_do_not_converge_are_nan():
+    species = OPEN_SPECIES["O"]
+    thermodynamics = species.get_thermodynamics(-4.9)
+    solve = thermodynamics.mu_to_temperature_array
+    # Two Newton steps do not reach -1000 eV (about 589000 K), nor can the bisection bracket it
+    thermodynamics.mu_to_temperature_array = lambda mu: solve(mu, max_iter=2)
+
+    with pytest.warns(RuntimeWarning):
+        temperature = species.convert(np.array([-1000.0, -6.0, -6.0, -np.inf]), "T_K", -4.9, thermodynamics)
+    assert np.isnan(temperature[0])
+    assert np.isfinite(temperature[1:3]).all() and temperature[3] == np.inf
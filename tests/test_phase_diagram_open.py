@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_entries
+from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+
+def get_ranges(entries, elements, sweep, **options):
+    analyzer = PhaseDiagramOpenAnalyzer(system=elements, open_element="O", sweep=sweep, **options)
+    ranges = analyzer.get_phase_diagram_data(entries=entries)
+
+    return ranges, analyzer.reference_chempot
+
+
+def assert_same_ranges(ranges, expected):
+    assert sorted(ranges) == sorted(expected)
+    for phase, windows in expected.items():
+        np.testing.assert_allclose(ranges[phase], windows, rtol=0.0, atol=1.0e-9)
+
+
+def test_facet_sweep_matches_the_grand_potential_sweep(entries):
+    facets, reference = get_ranges(entries, ["Ca", "Li", "O"], "facets")
+    grand_potential, _ = get_ranges(entries, ["Ca", "Li", "O"], "grand_potential")
+
+    assert_same_ranges(facets, grand_potential)
+    assert {"Li2O", "Li2O2", "CaO"} <= set(facets)
+    assert reference == pytest.approx(next(entry.energy_per_atom for entry in entries if entry.entry_id == "mp-3"))
+
+
+@pytest.mark.parametrize("elements, number_of_entries", [(["Li", "Ca", "O"], 30), (["Li", "Ca", "Fe", "O"], 60),
+                                                         (["Li", "Ca", "Fe", "Mn", "O"], 100)])
+def test_facet_sweep_matches_the_grand_potential_sweep_on_synthetic_systems(elements, number_of_entries):
+    entries = synthetic_entries(elements, number_of_entries)
+
+    assert_same_ranges(get_ranges(entries, elements, "facets")[0], get_ranges(entries, elements, "grand_potential")[0])
+
+
+def test_facet_chempots_match_pymatgen(entries):
+    from pymatgen.analysis.phase_diagram import PhaseDiagram
+    from pymatgen.core import Element
+
+    pd = PhaseDiagram(entries)
+    chempots = PhaseDiagramOpenAnalyzer.get_facet_chempots(pd, Element("O"))
+
+    assert len(chempots) == len(pd.facets)
+    facet_chempots = {"-".join(pd.qhull_entries[i].name for i in facet): chempot
+                      for facet, chempot in zip(pd.facets, chempots)}
+    for entry in pd.stable_entries:
+        for facet, expected in pd.get_all_chempots(entry.composition).items():
+            assert facet_chempots[facet] == pytest.approx(expected[Element("O")], abs=1.0e-9)
+
+
+def stub_intervals(analyzer, intervals):
+    # (transition chemical potential opening the interval, phases), in decreasing order
+    analyzer.iter_interval_data = lambda entries=None: (
+        (index, chempot, phases) for index, (chempot, phases) in enumerate(intervals))
+
+
+@pytest.mark.parametrize("lower_bound", [None, -9.0])
+def test_phases_stable_in_separate_windows_keep_them(lower_bound):
+    analyzer = PhaseDiagramOpenAnalyzer(["Li", "O"], "O", lower_bound=lower_bound)
+    stub_intervals(analyzer, [(-1.0, ["A"]), (-2.0, ["A", "B"]), (-3.0, ["B"]), (-4.0, ["A", "B"])])
+    end = -np.inf if lower_bound is None else lower_bound
+
+    assert analyzer.get_phase_diagram_data(entries=[]) == {"A": [[-1.0, -3.0], [-4.0, end]], "B": [[-2.0, end]]}
+
+
+def test_last_interval_ends_at_the_lower_bound(entries):
+    open_ended, _ = get_ranges(entries, ["Ca", "Li", "O"], "facets")
+    bounded, _ = get_ranges(entries, ["Ca", "Li", "O"], "facets", lower_bound=-20.0)
+
+    for phase, windows in open_ended.items():
+        assert bounded[phase][:-1] == windows[:-1]
+        assert bounded[phase][-1][1] == (-20.0 if windows[-1][1] == -np.inf else windows[-1][1])
+    assert -np.inf in [windows[-1][1] for windows in open_ended.values()]
@@ -0,0 +1,32 @@
+import json
+
+import numpy as np
+
+import PlotPhaseStabilityRange
+from stability_ranges import StabilityRangeTable
+
+RANGES = {"CaO": [[-4.9, -np.inf]], "Li2O2": [[-4.9, -5.6]], "Li2O": [[-5.6, -np.inf]]}
+
+
+def test_report_counts_requested_and_unique_temperature_conversions(tmp_path, capsys):
+    data = str(tmp_path / "ranges.npz")
+    report = tmp_path / "report.json"
+    StabilityRangeTable.from_dict(RANGES, "Li-Ca-O:O", -4.9).save_npz(data)
+
+    PlotPhaseStabilityRange.main(["--data", data, "--convert-to", "T_K", "--no-plot", "--report", str(report)])
+
+    counters = json.loads(report.read_text())["counters"]
+    # -4.9 and -5.6 twice each; the open lower bounds are not solved
+    assert counters["mu_to_temperature_requested"] == 4
+    assert counters["mu_to_temperature_unique"] == 2
+    assert "Li2O2" in capsys.readouterr().out
+
+
+def test_windows_of_a_phase_share_its_row():
+    Phase, LabelColor, Xi, Xr, Xc, BarYPos = PlotPhaseStabilityRange.get_bar_geometry(
+        ["A", "B", "A"], [0.0, 100.0, 500.0], [200.0, np.inf, 900.0], (0.0, 800.0))
+
+    assert BarYPos.tolist() == [0, 1, 0]
+    assert Xi == [0.0, 100.0, 500.0]
+    # The open window and the one past the axis are clipped to it
+    assert Xr == [200.0, 700.0, 300.0]
@@ -0,0 +1,86 @@
+import sys
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+OPTIONS = {"sweep": "facets", "lower_bound": None, "pymatgen": "test"}
+
+
+def test_request_key_does_not_scan_the_local_calculations(tmp_path):
+    local_path = tmp_path / "runs"
+    local_path.mkdir()
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}")
+
+    key = ResultCache.get_request_key(["Li", "O"], "O", OPTIONS, str(local_path), str(manifest))
+    (local_path / "OUTCAR").write_text("new run")
+    assert ResultCache.get_request_key(["O", "Li"], "O", OPTIONS, str(local_path), str(manifest)) == key
+
+    manifest.write_text('{"runs": 1}')
+    assert ResultCache.get_request_key(["Li", "O"], "O", OPTIONS, str(local_path), str(manifest)) != key
+    assert ResultCache.get_request_key(["Li", "O"], "O", OPTIONS, None) != key
+
+
+def test_requests_are_answered_until_they_expire(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), ttl=60.0)
+    ranges = {"Li2O": [[-4.0, float("-inf")]]}
+    cache.put("key", ranges, -4.9)
+    cache.put_request("request", "key")
+
+    assert cache.get_request("request") == (ranges, -4.9)
+    assert cache.get_request("other request") is None
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61.0)
+    assert cache.get_request("request") is None
+    assert cache.get("key") == (ranges, -4.9)
+
+
+def test_analysis_request_key_uses_the_defaults_of_the_analyzer(tmp_path):
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    analyzer = PhaseDiagramOpenAnalyzer(["Li", "O"], "O", workers=2)
+    assert ResultCache.get_analysis_request_key(["Li", "O"], "O", workers=4) == analyzer.get_request_key()
+
+    analyzer = PhaseDiagramOpenAnalyzer(["Li", "O"], "O", sweep="facets", local_path=str(tmp_path), lower_bound=-9.0)
+    assert ResultCache.get_analysis_request_key(["Li", "O"], "O", sweep="facets", local_path=str(tmp_path),
+                                                lower_bound=-9.0) == analyzer.get_request_key()
+
+
+def test_request_is_recorded_after_the_scan_updates_the_manifest(tmp_path, entries):
+    from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+
+    manifest = tmp_path / "manifest.json"
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    options = {"open_element": "O", "sweep": "facets", "local_path": str(tmp_path),
+               "local_manifest": str(manifest), "result_cache": cache}
+
+    def scan():
+        manifest.write_text('{"runs": 1}')
+        return list(entries)
+
+    analyzer = PhaseDiagramOpenAnalyzer(["Ca", "Li", "O"], **options)
+    analyzer.get_entries = scan
+    ranges = analyzer.get_phase_diagram_data()
+
+    rerun = PhaseDiagramOpenAnalyzer(["Ca", "Li", "O"], **options)
+    rerun.get_entries = lambda: pytest.fail("a recorded request fetched the entries")
+    assert rerun.get_phase_diagram_data() == ranges
+    assert rerun.reference_chempot == analyzer.reference_chempot
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_pymatgen_version_without_importlib_metadata(monkeypatch):
+    import pkg_resources
+    from result_cache import get_pymatgen_version
+
+    version = get_pymatgen_version()
+    assert version == pkg_resources.get_distribution("pymatgen").version
+
+    # Python 3.7 without the importlib_metadata backport
+    monkeypatch.delattr("importlib.metadata")
+    monkeypatch.setitem(sys.modules, "importlib.metadata", None)
+    monkeypatch.setitem(sys.modules, "importlib_metadata", None)
+    assert get_pymatgen_version() == version
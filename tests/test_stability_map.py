@@ -0,0 +1,42 @@
+import numpy as np
+
+from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+from stability_map import get_oxygen_chempot_grid, get_stability_map, label_chempots
+from thermodynamics import Thermodynamics
+
+
+def test_chempots_are_labeled_with_the_interval_below_the_transition():
+    chempots = [-1.0, -2.0, -3.0]
+    mu = np.array([[0.0, -1.0, -1.5, -2.0], [-2.5, -3.0, -4.0, -np.inf]])
+
+    # A transition belongs to the interval it opens
+    np.testing.assert_array_equal(label_chempots(mu, chempots), [[-1, 0, 0, 1], [1, 2, 2, 2]])
+    assert label_chempots(np.array([-5.0]), []).tolist() == [-1]
+
+
+def test_chempot_grid_broadcasts_temperatures_against_pressures():
+    thermodynamics = Thermodynamics()
+    temperatures = [300.0, 900.0, 1500.0]
+    pressures = [1.0e-10, 0.21]
+
+    mu = get_oxygen_chempot_grid(temperatures, pressures, thermodynamics)
+    assert mu.shape == (2, 3)
+    for i, pressure in enumerate(pressures):
+        for j, temperature in enumerate(temperatures):
+            assert mu[i, j] == thermodynamics.temperature_to_mu(temperature, pressure)/2.0
+
+
+def test_cells_have_the_phases_of_a_grand_potential_diagram_at_their_chempot(entries):
+    from pymatgen.analysis.phase_diagram import GrandPotentialPhaseDiagram
+    from pymatgen.core import Element
+
+    analyzer = PhaseDiagramOpenAnalyzer(["Ca", "Li", "O"], "O", sweep="facets")
+    stability_map = get_stability_map(analyzer, np.linspace(300.0, 2500.0, 6), np.logspace(-25.0, 0.0, 5),
+                                      entries=entries)
+
+    assert len(np.unique(stability_map.labels)) > 1
+    elements = [Element(el) for el in ("Ca", "Li", "O")]
+    for i in range(len(stability_map.pressures)):
+        for j in range(len(stability_map.temperatures)):
+            gcpd = GrandPotentialPhaseDiagram(entries, {Element("O"): stability_map.mu[i, j]}, elements)
+            assert stability_map.get_phases(j, i) == tuple(sorted(entry.name for entry in gcpd.stable_entries))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from PlotPhaseStabilityRange import load_stability_ranges
+from stability_ranges import StabilityRangeTable
+
+ROWS = [("Li-Ca-O", "O", "CaO", -4.9, -np.inf, -4.9),
+        ("Li-Ca-O", "O", "Li2O2", -4.9, -5.6, -4.9),
+        ("Li-Ca-O", "O", "Li2O", -5.6, -np.inf, -4.9),
+        ("Li-Fe-P-O", "Li", "LiFePO4", -1.9, -5.3, -1.9),
+        ("Li-Fe-P-O", "Li", "Li2O", -5.3, -np.inf, -1.9)]
+
+
+def assert_same_table(table, expected):
+    for column in StabilityRangeTable.columns + ("systems", "formulas", "references"):
+        np.testing.assert_array_equal(getattr(table, column), getattr(expected, column))
+
+
+def test_dict_round_trip_keeps_separate_windows():
+    ranges = {"Li2O2": [[-4.2, -4.6], [-5.0, -5.3]], "Li2O": [[-4.6, -5.0], [-5.3, -np.inf]]}
+    table = StabilityRangeTable.from_dict(ranges, "Li-O:O", -4.9)
+
+    assert len(table) == 4
+    assert table.phases == ["Li2O2", "Li2O2", "Li2O", "Li2O"]
+    assert table.to_dict() == ranges
+    assert table.get_reference("Li-O:O") == -4.9
+
+
+def test_npz_round_trip(tmp_path):
+    table = StabilityRangeTable.from_rows(ROWS)
+    table.save_npz(str(tmp_path / "ranges.npz"))
+
+    assert_same_table(StabilityRangeTable.load_npz(str(tmp_path / "ranges.npz")), table)
+
+
+def test_npy_columns_are_memory_mapped_and_selected(tmp_path):
+    table = StabilityRangeTable.from_rows(ROWS)
+    table.save(str(tmp_path / "ranges"))
+
+    loaded = StabilityRangeTable.load(str(tmp_path / "ranges"))
+    assert_same_table(loaded, table)
+    for column in StabilityRangeTable.columns:
+        assert isinstance(getattr(loaded, column), np.memmap)
+
+    rows = loaded.select(system="Li-Fe-P-O:Li")
+    assert rows.phases == ["LiFePO4", "Li2O"]
+    np.testing.assert_array_equal(rows.mu_start, [-1.9, -5.3])
+    assert rows.get_reference("Li-Fe-P-O:Li") == -1.9
+    rows = loaded.select(phase="Li2O")
+    assert rows.systems[rows.system_ids].tolist() == ["Li-Ca-O:O", "Li-Fe-P-O:Li"]
+    assert len(loaded.select(system="Li-Ca-O:O", phase="LiFePO4")) == 0
+    assert len(loaded.select(system="unknown")) == 0
+
+
+@pytest.mark.parametrize("name", ["ranges.npz", "ranges"])
+def test_plot_reads_the_rows_of_its_system(tmp_path, name):
+    table = StabilityRangeTable.from_rows(ROWS)
+    path = str(tmp_path / name)
+    if name.endswith(".npz"):
+        table.save_npz(path)
+    else:
+        table.save(path)
+
+    rows = load_stability_ranges(path, "Li-Ca-O:O")
+    assert rows.phases == ["CaO", "Li2O2", "Li2O"]
+    np.testing.assert_array_equal(rows.mu_end, [-np.inf, -5.6, -np.inf])
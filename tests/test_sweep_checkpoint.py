@@ -0,0 +1,50 @@
+import json
+
+from PhaseDiagramOpen import PhaseDiagramOpenAnalyzer
+from sweep_checkpoint import SweepCheckpoint
+
+
+def cut_last_line(path):
+    # An interruption while the last interval was being written leaves half of its line
+    text = open(path).read().rstrip("\n")
+    last_line = text.split("\n")[-1]
+    with open(path, "w") as f:
+        f.write(text[:len(text) - len(last_line)//2])
+
+
+def test_a_line_cut_short_is_dropped_and_not_appended_to(tmp_path):
+    path = str(tmp_path / "sweep.jsonl")
+    with SweepCheckpoint(path, "key", 4) as checkpoint:
+        checkpoint.record(0, ["Li2O2"])
+        checkpoint.record(1, ["Li2O2", "Li2O"])
+    cut_last_line(path)
+
+    with SweepCheckpoint(path, "key", 4) as checkpoint:
+        assert checkpoint.done == {0: ["Li2O2"]}
+        checkpoint.record(1, ["Li2O"])
+    lines = [json.loads(line) for line in open(path).read().splitlines()]
+    assert lines == [{"key": "key", "intervals": 4}, {"index": 0, "phases": ["Li2O2"]},
+                     {"index": 1, "phases": ["Li2O"]}]
+
+    # Another sweep starts again
+    assert SweepCheckpoint(path, "other key", 4).done == {}
+
+
+def test_interrupted_sweep_resumes_from_the_last_complete_interval(tmp_path, entries):
+    path = str(tmp_path / "sweep.jsonl")
+    progress = []
+    analyzer = PhaseDiagramOpenAnalyzer(["Ca", "Li", "O"], "O", sweep="facets", checkpoint=path,
+                                        progress=lambda done, total, rate, eta: progress.append((done, total)))
+    ranges = analyzer.get_phase_diagram_data(entries=entries)
+    intervals = analyzer.report.counters["intervals"]
+    assert intervals > 2
+    assert progress == [(done, intervals) for done in range(1, intervals + 1)]
+    cut_last_line(path)
+
+    progress = []
+    resumed = PhaseDiagramOpenAnalyzer(["Ca", "Li", "O"], "O", sweep="facets", checkpoint=path,
+                                       progress=lambda done, total, rate, eta: progress.append((done, total)))
+    assert resumed.get_phase_diagram_data(entries=entries) == ranges
+    # Only the interval whose line was cut is computed again
+    assert resumed.report.counters["intervals_resumed"] == intervals - 1
+    assert progress == [(intervals, intervals)]
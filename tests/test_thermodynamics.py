@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+
+from open_species import HYDROGEN, NITROGEN
+from thermodynamics import ShomateTable, Thermodynamics
+
+MU = np.array([-7.0, -6.5, -6.0, -5.5, -5.2])
+
+
+def test_explicit_pressure_matches_the_pressure_attribute():
+    thermodynamics = Thermodynamics()
+    at_attribute = Thermodynamics()
+    at_attribute.pressure = 1.0e-5
+
+    for mu in MU:
+        assert thermodynamics.mu_to_temperature(mu, 0.21) == thermodynamics.mu_to_temperature(mu)
+        assert thermodynamics.mu_to_temperature(mu, 1.0e-5) == pytest.approx(
+            at_attribute.mu_to_temperature(mu), abs=1.0e-9)
+    for temperature in (300.0, 700.0, 1500.0, 2500.0):
+        assert thermodynamics.temperature_to_mu(temperature, 1.0e-5) == pytest.approx(
+            at_attribute.temperature_to_mu(temperature), abs=1.0e-12)
+
+    temperature, converged = thermodynamics.mu_to_temperature_array(MU, 1.0e-5)
+    assert converged.all()
+    np.testing.assert_allclose(temperature, at_attribute.mu_to_temperature_array(MU)[0], atol=1.0e-9)
+    # temperature_to_mu gives the chemical potential of the molecule, 2 mu
+    np.testing.assert_allclose(thermodynamics.temperature_to_mu_array(temperature, 1.0e-5), 2.0*MU, atol=1.0e-6)
+
+
+def test_pressures_broadcast_against_mu():
+    thermodynamics = Thermodynamics()
+    pressures = np.array([1.0e-10, 1.0e-3, 0.21, 1.0])
+
+    temperature, converged = thermodynamics.mu_to_temperature_array(MU[:, None], pressures[None, :])
+    assert temperature.shape == (len(MU), len(pressures)) and converged.all()
+    for i, mu in enumerate(MU):
+        for j, pressure in enumerate(pressures):
+            assert temperature[i, j] == pytest.approx(thermodynamics.mu_to_temperature(mu, pressure), abs=2.0e-3)
+
+
+def test_scalar_solver_rejects_arrays():
+    thermodynamics = Thermodynamics()
+
+    with pytest.raises(ValueError):
+        thermodynamics.mu_to_temperature(-6.0, np.array([0.21, 1.0]))
+    with pytest.raises(ValueError):
+        thermodynamics.mu_to_temperature(MU)
+
+
+@pytest.mark.parametrize("gas", [{}, NITROGEN, HYDROGEN], ids=["O2", "N2", "H2"])
+def test_continuous_ranges_have_no_jump(gas):
+    thermodynamics = Thermodynamics(**gas)
+    original = Thermodynamics(continuous=False, **gas)
+
+    for boundary in thermodynamics.temperature_range[1:3]:
+        above = boundary*(1.0 + 1.0e-12)
+        # The fits themselves jump at the boundaries
+        assert abs(original.enthalpy_minusRef(above) - original.enthalpy_minusRef(boundary)) > 1.0e-8
+        assert thermodynamics.enthalpy_minusRef(above) == pytest.approx(
+            thermodynamics.enthalpy_minusRef(boundary), abs=1.0e-12)
+        assert thermodynamics.entropy(above) == pytest.approx(thermodynamics.entropy(boundary), abs=1.0e-14)
+
+        # mu decreases with T, also within a micro-kelvin of the boundary
+        temperatures = np.concatenate([np.linspace(boundary - 1.0e-3, boundary + 1.0e-3, 2001),
+                                       np.linspace(boundary - 100.0, boundary + 100.0, 2001)])
+        mu = thermodynamics.temperature_to_mu_array(np.unique(temperatures))
+        assert np.all(np.diff(mu) < 0.0)
+
+
+def test_continuous_ranges_leave_the_first_range_unchanged():
+    thermodynamics = Thermodynamics()
+    original = Thermodynamics(continuous=False)
+    temperatures = np.linspace(100.0, 700.0, 61)
+
+    np.testing.assert_array_equal(thermodynamics.temperature_to_mu_array(temperatures),
+                                  original.temperature_to_mu_array(temperatures))
+    # Above it, the shift stays below 1e-4 eV per atom
+    temperatures = np.linspace(100.0, 6000.0, 5901)
+    shift = thermodynamics.temperature_to_mu_array(temperatures) - original.temperature_to_mu_array(temperatures)
+    assert np.abs(shift).max()/2.0 < 1.0e-4
+
+
+def test_points_not_converged_after_max_iter_are_bisected():
+    thermodynamics = Thermodynamics()
+    mu = np.linspace(-8.0, -5.0, 50)
+
+    newton, converged = thermodynamics.mu_to_temperature_array(mu)
+    assert converged.all()
+    bisected, converged = thermodynamics.mu_to_temperature_array(mu, max_iter=1)
+    assert converged.all()
+    np.testing.assert_allclose(bisected, newton, atol=2.0e-3)
+
+
+def test_points_bisection_cannot_solve_are_not_converged():
+    thermodynamics = Thermodynamics()
+
+    # -1000 eV is about 589000 K, above the bracket of the bisection
+    temperature, converged = thermodynamics.mu_to_temperature_array(np.array([-1000.0, np.nan, -6.0]), max_iter=2)
+    assert converged.tolist() == [False, False, True]
+    assert np.isnan(temperature[1])
+
+    temperature, converged = thermodynamics.mu_to_temperature_array(np.array([-1000.0]))
+    assert converged.all()
+    assert temperature[0] == pytest.approx(589142.0, rel=1.0e-5)
+
+
+@pytest.mark.parametrize("gas", [{}, NITROGEN, HYDROGEN], ids=["O2", "N2", "H2"])
+@pytest.mark.parametrize("pressure", [1.0e-10, 1.0e-3, None, 10.0])
+def test_table_stays_within_its_documented_errors(gas, pressure):
+    analytic = Thermodynamics(**gas)
+    tabulated = Thermodynamics(**gas)
+    tabulated.use_table()
+    T0, T1, T2, T3 = analytic.temperature_range
+    # Random temperatures, the range boundaries, and a little beyond the ranges
+    temperatures = np.concatenate([np.random.default_rng(0).uniform(T0, T3, 20000),
+                                   [T0, T1, T2, T3, T1 + 1.0e-9, T0 - 50.0, T3 + 500.0]])
+
+    assert np.abs(tabulated.enthalpy_minusRef_array(temperatures) -
+                  analytic.enthalpy_minusRef_array(temperatures)).max() < ShomateTable.max_error
+    assert np.abs((tabulated.entropy_array(temperatures) - analytic.entropy_array(temperatures))*
+                  np.clip(temperatures, T0, T3)).max() < ShomateTable.max_error
+    mu = analytic.temperature_to_mu_array(temperatures, pressure)
+    assert np.abs(tabulated.temperature_to_mu_array(temperatures, pressure) - mu).max() < ShomateTable.max_error
+
+    temperature, converged = tabulated.mu_to_temperature_array(mu/2.0, pressure)
+    assert converged.all()
+    np.testing.assert_allclose(temperature, analytic.mu_to_temperature_array(mu/2.0, pressure, tol=1.0e-10)[0],
+                               rtol=0.0, atol=ShomateTable.max_temperature_error)
+    np.testing.assert_allclose(temperature, temperatures, rtol=0.0, atol=ShomateTable.max_temperature_error)
+
+
+def test_table_is_shared_and_leaves_the_scalar_methods_alone():
+    thermodynamics = Thermodynamics()
+    thermodynamics.use_table()
+    other = Thermodynamics(Ho_eV=-9.0)
+    other.use_table()
+
+    assert other.table is thermodynamics.table
+    assert thermodynamics.mu_to_temperature(-6.0) == Thermodynamics().mu_to_temperature(-6.0)
+    assert thermodynamics.temperature_to_mu(1500.0) == Thermodynamics().temperature_to_mu(1500.0)
+
+
+def test_table_keeps_the_solver_for_what_it_cannot_invert():
+    thermodynamics = Thermodynamics()
+    thermodynamics.use_table()
+
+    # Not finite, and far above the Shomate ranges, where mu is linear in T
+    temperature, converged = thermodynamics.mu_to_temperature_array(np.array([np.nan, -np.inf, -1000.0]))
+    assert converged.tolist() == [False, False, True]
+    assert np.isnan(temperature[0])
+    assert temperature[2] == pytest.approx(Thermodynamics().mu_to_temperature_array(np.array([-1000.0]))[0][0])
+
+    # Arrays of pressures are solved as without a table
+    pressures = np.array([1.0e-3, 1.0])
+    temperature, converged = thermodynamics.mu_to_temperature_array(-6.0, pressures)
+    assert converged.all()
+    np.testing.assert_allclose(temperature, Thermodynamics().mu_to_temperature_array(-6.0, pressures)[0],
+                               atol=2.0e-3)
+
+    # mu of the published fits is not continuous, so it is solved for
+    original = Thermodynamics(continuous=False)
+    original.use_table()
+    assert not original.table.is_invertible(original.pressure_term())
+    np.testing.assert_allclose(original.mu_to_temperature_array(MU)[0],
+                               Thermodynamics(continuous=False).mu_to_temperature_array(MU)[0], atol=2.0e-3)
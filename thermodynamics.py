@@ -8,8 +8,11 @@ Updated on Mon Nov 26 21:30:00 2018
 @author: Rodolpho
 """
 
+import functools
 import math
 
+import numpy as np
+
 """
 This class calculates entropies and enthalpies of oxygen gas, based on fits of experimental data, 
 and then uses them to estimate iteratively the temperature corresponding to a given oxygen chemical 
@@ -18,7 +21,11 @@ potential at partial pressure of 0.21 atm.
 
 
 class Thermodynamics:
-    def __init__(self, *args, **kwargs):
+    # The coefficients, the temperature ranges, Ho_eV and HrefMinusHo_kJmol default to those of oxygen gas;
+    # give them to use another diatomic gas (see open_species.py). The coefficients are adjusted by
+    # make_continuous() unless continuous=False, which keeps the published fits as they are.
+    def __init__(self, *args, coefficients=None, temperature_range=None, Ho_eV=None, HrefMinusHo_kJmol=None,
+                 continuous=True, **kwargs):
         # Shomate equation coefficients A, B, C, D, E, F, G for 0.1 MPa, fitted from standard experimental data.
         # Source: https://webbook.nist.gov/cgi/cbook.cgi?ID=C7782447&Mask=1
         self.c1 = (31.32234, -20.23531, 57.86644, -36.50624, -
@@ -27,6 +34,12 @@ class Thermodynamics:
                    0.741599, -11.32468, 236.1663)  # Range: 700 K - 2000 K
         self.c3 = (20.91111, 10.72071, -2.020498, 0.146449, 9.245722,
                    5.337651, 237.6185)    # Range: 2000 K - 6000 K
+        if coefficients is not None:
+            self.c1, self.c2, self.c3 = coefficients
+        # Lower bound, boundaries between the coefficient sets and upper bound of the Shomate ranges, in K
+        self.temperature_range = (100.0, 700.0, 2000.0, 6000.0)
+        if temperature_range is not None:
+            self.temperature_range = tuple(float(T) for T in temperature_range)
         # Conversion factors
         self.kJmol_to_eV = 0.01036427230133138
         self.JmolK_to_eVK = 0.00001036427230133138
@@ -35,38 +48,74 @@ class Thermodynamics:
         self.kB = float(8.6173303e-5)
         # Energy per atom at 0 K in eV for oxygen, taken from the Materials Project website (ID: mp-12957). Calculated via DFT
         self.Ho_eV = -4.93552791875*2.0
+        if Ho_eV is not None:
+            self.Ho_eV = Ho_eV
         # Difference between the enthalpy at 298.15 K and the one at 0 K, in kJ/mol
         # Source: Malcolm W. Chase Jr., NIST-JANAF Themochemical Tables, Fourth Edition, J. Phys. Chem. Ref. Data, Monograph 9, 1998, pp. 1744
-        self.HrefMinusHo_eV = float(8.683)*self.kJmol_to_eV
+        if HrefMinusHo_kJmol is None:
+            HrefMinusHo_kJmol = 8.683
+        self.HrefMinusHo_eV = float(HrefMinusHo_kJmol)*self.kJmol_to_eV
         # Enthalpy of oxygen gas at 298.15 K in eV, assuming the Materials Project value for the enthalpy at 0 K.
         self.Href = self.HrefMinusHo_eV + self.Ho_eV
         # Pressure in atm. Change it to the desired value.
         self.pressure = 0.21
+        # Number of mu -> T solves and of iterations they took, to see how much work the solver does
+        self.solver_calls = 0
+        self.solver_iterations = 0
+        # ShomateTable used by the array methods instead of the Shomate equations, see use_table()
+        self.table = None
+        if continuous:
+            self.make_continuous()
+
+    # The fits of the three ranges do not meet exactly at the range boundaries: the enthalpy and the entropy
+    # jump by ~1e-5 eV and ~1e-8 eV/K, so the chemical potential is not monotonic there (e.g. it goes up by
+    # 7e-6 eV at 700 K for oxygen). This function shifts the constants F and G of the second and third sets
+    # so that H and S are continuous at the boundaries, leaving the first set and the heat capacity unchanged.
+    # Above the first boundary mu moves by up to 9e-5 eV per atom (oxygen at 6000 K), i.e. 0.05 K at most.
+    def make_continuous(self):
+        T0, T1, T2, T3 = self.temperature_range
+        for boundary, lower, upper in ((T1, 'c1', 'c2'), (T2, 'c2', 'c3')):
+            t = boundary/1000.0
+            jumps = []
+            for A, B, C, D, E, F, G in (getattr(self, lower), getattr(self, upper)):
+                jumps.append((A*t + B*t**2/2.0 + C*t**3/3.0 + D*t**4/4.0 - E/t + F,
+                              A*math.log(t) + B*t + C*t**2/2.0 + D*t**3/3.0 - E/2.0/t**2 + G))
+            (H_lower, S_lower), (H_upper, S_upper) = jumps
+            A, B, C, D, E, F, G = getattr(self, upper)
+            setattr(self, upper, (A, B, C, D, E, F + H_lower - H_upper, G + S_lower - S_upper))
+
+    # kB*ln(p/p0) in eV/K for a pressure in atm, scalar or array. None uses self.pressure.
+    def pressure_term(self, pressure=None):
+        if pressure is None:
+            return self.kB*math.log(self.pressure*self.atm_to_MPa/0.1)
+
+        return self.kB*np.log(np.asarray(pressure, dtype=float)*self.atm_to_MPa/0.1)
 
     # This function returns the entropy of oxygen gas at 0.1 MPa and given temperature in eV
     def entropy(self, temperature):
 
-        if temperature < 100.0:
-            temperature = 100.0
-        if temperature > 6000.0:
-            temperature = 6000.0
+        T0, T1, T2, T3 = self.temperature_range
+        if temperature < T0:
+            temperature = T0
+        if temperature > T3:
+            temperature = T3
 
         # Use the appropriate Shomate equation coefficients for the given temperature
-        if temperature >= 100 and temperature <= 700:
+        if temperature >= T0 and temperature <= T1:
             A = self.c1[0]
             B = self.c1[1]
             C = self.c1[2]
             D = self.c1[3]
             E = self.c1[4]
             G = self.c1[6]
-        elif temperature > 700 and temperature <= 2000:
+        elif temperature > T1 and temperature <= T2:
             A = self.c2[0]
             B = self.c2[1]
             C = self.c2[2]
             D = self.c2[3]
             E = self.c2[4]
             G = self.c2[6]
-        elif temperature > 2000 and temperature <= 6000:
+        elif temperature > T2 and temperature <= T3:
             A = self.c3[0]
             B = self.c3[1]
             C = self.c3[2]
@@ -86,27 +135,28 @@ class Thermodynamics:
     # This function returns the enthalpy of oxygen gas at given temperature minus the one at 298.15 K, in eV
     def enthalpy_minusRef(self, temperature):
 
-        if temperature < 100.0:
-            temperature = 100.0
-        if temperature > 6000.0:
-            temperature = 6000.0
+        T0, T1, T2, T3 = self.temperature_range
+        if temperature < T0:
+            temperature = T0
+        if temperature > T3:
+            temperature = T3
 
         # Use the appropriate Shomate equation coefficients for the given temperature
-        if temperature >= 100 and temperature <= 700:
+        if temperature >= T0 and temperature <= T1:
             A = self.c1[0]
             B = self.c1[1]
             C = self.c1[2]
             D = self.c1[3]
             E = self.c1[4]
             F = self.c1[5]
-        elif temperature > 700 and temperature <= 2000:
+        elif temperature > T1 and temperature <= T2:
             A = self.c2[0]
             B = self.c2[1]
             C = self.c2[2]
             D = self.c2[3]
             E = self.c2[4]
             F = self.c2[5]
-        elif temperature > 2000 and temperature <= 6000:
+        elif temperature > T2 and temperature <= T3:
             A = self.c3[0]
             B = self.c3[1]
             C = self.c3[2]
@@ -121,21 +171,82 @@ class Thermodynamics:
         # print(HMinusHref_eV/self.kJmol_to_eV)
         return HMinusHref_eV
 
-    # This function calculates iteratively the temperature corresponding to a given oxygen chemical potential
-    def mu_to_temperature(self, mu):
+    # This function returns the Shomate equation coefficients A, B, C, D, E, F, G as arrays matching
+    # the given temperatures, which must already be clamped to the Shomate ranges. The ranges are chosen
+    # exactly as in the scalar methods above.
+    def coefficients_array(self, temperature):
+        condlist = [temperature <= self.temperature_range[1], temperature <= self.temperature_range[2]]
+
+        return [np.select(condlist, [a1, a2], a3) for a1, a2, a3 in zip(self.c1, self.c2, self.c3)]
+
+    # From now on, the array methods evaluate the entropy, the enthalpy and the chemical potential with a
+    # ShomateTable whose cells are at most step K wide, and mu_to_temperature_array inverts it directly
+    # instead of iterating. Their errors are below ShomateTable.max_error and max_temperature_error.
+    # The scalar methods are not affected.
+    def use_table(self, step=5.0):
+        self.table = ShomateTable.get_table(self, step)
+
+    # Array version of entropy(). Accepts a NumPy array of temperatures in K; scalars are passed on to
+    # entropy() so that they give exactly the same result.
+    def entropy_array(self, temperature):
+        if np.ndim(temperature) == 0:
+            return self.entropy(float(temperature))
+        if self.table is not None:
+            return self.table.entropy(temperature)
+
+        temperature = np.clip(np.asarray(temperature, dtype=float), self.temperature_range[0],
+                              self.temperature_range[3])
+        A, B, C, D, E, F, G = self.coefficients_array(temperature)
+
+        t = temperature/1000.0
+        S_JmolK = A*np.log(t) + B*t + C*t**2/2.0 + \
+            D*t**3/3.0 - E/2.0/t**2 + G
+        S_eVK = S_JmolK*self.JmolK_to_eVK
+
+        return S_eVK
+
+    # Array version of enthalpy_minusRef(). Scalars are passed on to enthalpy_minusRef().
+    def enthalpy_minusRef_array(self, temperature):
+        if np.ndim(temperature) == 0:
+            return self.enthalpy_minusRef(float(temperature))
+        if self.table is not None:
+            return self.table.enthalpy_minusRef(temperature)
+
+        temperature = np.clip(np.asarray(temperature, dtype=float), self.temperature_range[0],
+                              self.temperature_range[3])
+        A, B, C, D, E, F, G = self.coefficients_array(temperature)
+
+        t = temperature/1000.0
+        HMinusHref_kJmolK = A*t + B*t**2/2.0 + C*t**3/3.0 + D*t**4/4.0 - E/t + F
+        HMinusHref_eV = HMinusHref_kJmolK*self.kJmol_to_eV
+
+        return HMinusHref_eV
+
+    # This function calculates iteratively the temperature corresponding to a given oxygen chemical potential,
+    # at the given scalar pressure in atm (None uses self.pressure). Arrays go to mu_to_temperature_array().
+    def mu_to_temperature(self, mu, pressure=None):
+        if np.ndim(mu) != 0 or np.ndim(pressure) != 0:
+            raise ValueError("mu_to_temperature takes a scalar mu and pressure; use mu_to_temperature_array "
+                             "for arrays")
+
+        self.solver_calls += 1
         # We need an initial guess for temperature... Why not RT? =)
         temperature = 298.0
         # Just a dummy variable for the iterations
         temperature_old = 0.0
+        # Terms that do not depend on the temperature
+        numerator = 2*mu - self.Href
+        log_pressure_term = self.pressure_term(pressure)
 
         # Do this until the temperature converges within 0.001 K
         while abs(temperature-temperature_old) > 1.0e-3:
 
+            self.solver_iterations += 1
             temperature_old = temperature
             # The following expression was obtained by solving the equation below for T, with p = 0.21 atm and p0 = 0.1 MPa
             # u(T,p)=[h(T)-h(Tref)]+h(Tref)-T*s(T,p0)+kB*T*ln(p/p0)
-            temperature = (2*mu - self.enthalpy_minusRef(temperature_old) - self.Href)/(
-                self.kB*math.log(self.pressure*self.atm_to_MPa/0.1) - self.entropy(temperature_old))
+            temperature = (numerator - self.enthalpy_minusRef(temperature_old))/(
+                log_pressure_term - self.entropy(temperature_old))
 
             # No negative temperatures!
             if temperature < 0.0:
@@ -143,14 +254,105 @@ class Thermodynamics:
 
         return temperature
 
-    def temperature_to_mu(self, temperature):
+    # Batched version of mu_to_temperature() for NumPy arrays of oxygen chemical potentials and pressures in atm
+    # (None uses self.pressure), broadcast against each other. The update is the same as above (it is actually
+    # Newton's method on the monotonic u(T)), but it is applied to all the points at once and stops after max_iter
+    # iterations. Points that have not converged by then, e.g. because the iteration jumps back and forth across
+    # a range boundary, are solved by bisection between 0 K and upper K. Returns the temperatures and a boolean
+    # array telling which points converged within tol. Points bisection cannot solve (the solution is outside the
+    # bracket, or mu is not finite) are reported as not converged; their temperature is the bracket end or NaN.
+    # With a table (see use_table) and a scalar pressure, the table is inverted without iterating; then only
+    # the points whose mu is not finite are not converged.
+    def mu_to_temperature_array(self, mu, pressure=None, max_iter=100, tol=1.0e-3, upper=1.0e5):
+        if self.table is not None and np.ndim(pressure) == 0:
+            log_pressure_term = float(self.pressure_term(pressure))
+            if self.table.is_invertible(log_pressure_term):
+                numerator = 2*np.asarray(mu, dtype=float) - self.Href
+                self.solver_calls += numerator.size
+                temperature = self.table.temperature(numerator, log_pressure_term)
+                return temperature[()], np.isfinite(temperature)[()]
+
+        mu, log_pressure_term = np.broadcast_arrays(np.asarray(mu, dtype=float), self.pressure_term(pressure))
+        numerator = 2*mu - self.Href
+
+        temperature = np.full(mu.shape, 298.0)
+        converged = np.zeros(mu.shape, dtype=bool)
+
+        self.solver_calls += mu.size
+        for _ in range(max_iter):
+            active = ~converged
+            if not active.any():
+                break
+
+            self.solver_iterations += int(active.sum())
+
+            temperature_old = temperature[active]
+            temperature_new = (numerator[active] - self.enthalpy_minusRef_array(temperature_old))/(
+                log_pressure_term[active] - self.entropy_array(temperature_old))
+
+            # No negative temperatures!
+            temperature_new = np.maximum(temperature_new, 0.0)
+
+            temperature[active] = temperature_new
+            converged[active] = np.abs(temperature_new - temperature_old) <= tol
+
+        failed = ~converged
+        if failed.any():
+            finite = np.isfinite(numerator[failed]) & np.isfinite(log_pressure_term[failed])
+            bisected = self.bisect_temperature(numerator[failed], log_pressure_term[failed], tol, upper)
+            temperature[failed] = np.where(finite, bisected, np.nan)
+            # A solution that sits on an end of the bracket is only a bound
+            converged[failed] = finite & (bisected > tol) & (bisected < upper - tol)
+
+        return temperature[()], converged[()]
+
+    # Bisection on 2*u(T) - Href = [h(T)-h(Tref)] - T*[s(T,p0) - kB*ln(p/p0)], which decreases with T, between
+    # 0 K and upper K. Takes the hoisted terms of mu_to_temperature_array and returns the temperatures within tol.
+    def bisect_temperature(self, numerator, log_pressure_term, tol=1.0e-3, upper=1.0e5):
+        low = np.zeros(numerator.shape)
+        high = np.full(numerator.shape, upper)
+
+        while np.max(high - low, initial=0.0) > tol:
+            self.solver_iterations += numerator.size
+            middle = (low + high)/2.0
+            value = self.enthalpy_minusRef_array(middle) - middle*(self.entropy_array(middle) - log_pressure_term)
+            above = value > numerator
+            low = np.where(above, middle, low)
+            high = np.where(above, high, middle)
+
+        return (low + high)/2.0
+
+    def temperature_to_mu(self, temperature, pressure=None):
 
         oxygen_enthalpy = self.Ho_eV + self.HrefMinusHo_eV + \
             self.enthalpy_minusRef(temperature)
 
+        if pressure is None:
+            mu = oxygen_enthalpy - temperature * \
+                self.entropy(temperature) + temperature*self.kB * \
+                math.log(self.pressure*self.atm_to_MPa/0.1)
+        else:
+            mu = oxygen_enthalpy - temperature * \
+                self.entropy(temperature) + temperature*self.pressure_term(pressure)
+
+        return mu
+
+    # Array version of temperature_to_mu(), for temperatures and pressures in atm (None uses self.pressure)
+    # broadcast against each other. H and S are evaluated once per temperature, so a T x p grid only costs
+    # len(T) Shomate evaluations. Scalars are passed on to temperature_to_mu().
+    def temperature_to_mu_array(self, temperature, pressure=None):
+        if np.ndim(temperature) == 0 and np.ndim(pressure) == 0:
+            return self.temperature_to_mu(float(temperature), None if pressure is None else float(pressure))
+
+        temperature = np.asarray(temperature, dtype=float)
+        if self.table is not None and np.ndim(pressure) == 0:
+            return self.Href + self.table.chemical_potential(temperature, float(self.pressure_term(pressure)))
+
+        oxygen_enthalpy = self.Ho_eV + self.HrefMinusHo_eV + \
+            self.enthalpy_minusRef_array(temperature)
+
         mu = oxygen_enthalpy - temperature * \
-            self.entropy(temperature) + temperature*self.kB * \
-            math.log(self.pressure*self.atm_to_MPa/0.1)
+            self.entropy_array(temperature) + temperature*self.pressure_term(pressure)
 
         return mu
 
@@ -170,6 +372,176 @@ class Thermodynamics:
         }
 
 
+"""
+Precomputed table of a Thermodynamics object for the array methods. The Shomate ranges are cut into cells of
+at most step K on a uniform grid whose nodes include the range boundaries, and the enthalpy, the entropy and the
+chemical potential are cubic Hermite splines on each cell, using the exact derivatives dH/dT = Cp,
+dS/dT = Cp/T and d(H - T*(S - kB*ln(p/p0)))/dT = kB*ln(p/p0) - S of the range the cell belongs to. Since the
+chemical potential decreases with the temperature, it is inverted the same way, with a spline of T against mu on
+each cell, found through a uniform index of mu; this needs mu to be continuous and monotonic at the pressure,
+as with make_continuous(). Below and above the Shomate ranges, H and S are those at the range ends, as in the
+Shomate equations, so mu is linear in T there and both directions are exact.
+
+The errors against the Shomate equations are below max_error (in eV, for H, T*S and the chemical potential of
+the molecule) and below max_temperature_error (in K, for the inverse) for the gases in open_species.py with
+the default step; tests/test_thermodynamics.py checks them. Building a table takes about a millisecond, so the
+tables are only kept in memory: one per set of coefficients and step, shared by the Thermodynamics objects
+that use them, with the cells of the chemical potential kept per pressure.
+"""
+
+
+class ShomateTable:
+    max_error = 1.0e-8
+    max_temperature_error = 1.0e-5
+    # Tables by coefficients and step, and the most pressures a table keeps the cells of
+    tables = {}
+    max_pressures = 64
+
+    def __init__(self, thermodynamics, step=5.0):
+        T0, T1, T2, T3 = thermodynamics.temperature_range
+        # The largest step that puts nodes on the boundaries (to 1 mK) and is not above the given one
+        grid = functools.reduce(math.gcd, [int(round((T - T0)*1000.0)) for T in (T1, T2, T3)])/1000.0
+        self.step = grid/math.ceil(grid/step)
+        self.number_of_cells = int(round((T3 - T0)/self.step))
+        self.lower = T0
+        self.left = T0 + self.step*np.arange(self.number_of_cells)
+        self.right = self.left + self.step
+        # H, S and Cp at both ends of every cell, with the coefficients of the range of the cell
+        ranges = (self.left + self.step/2.0 > T1).astype(np.intp) + (self.left + self.step/2.0 > T2)
+        coefficients = np.array([thermodynamics.c1, thermodynamics.c2, thermodynamics.c3])[ranges].T
+        self.ends = [self.shomate(self.left, coefficients, thermodynamics),
+                     self.shomate(self.right, coefficients, thermodynamics)]
+        (H0, S0, Cp0), (H1, S1, Cp1) = self.ends
+        self.enthalpy_cells = self.hermite(H0, H1, Cp0*self.step, Cp1*self.step)
+        self.entropy_cells = self.hermite(S0, S1, Cp0/self.left*self.step, Cp1/self.right*self.step)
+        self.pressures = {}
+
+    # The table of the coefficients of thermodynamics and step, built on first use
+    @classmethod
+    def get_table(cls, thermodynamics, step=5.0):
+        key = (thermodynamics.c1, thermodynamics.c2, thermodynamics.c3, thermodynamics.temperature_range,
+               thermodynamics.kJmol_to_eV, thermodynamics.JmolK_to_eVK, float(step))
+        if key not in cls.tables:
+            cls.tables[key] = cls(thermodynamics, step)
+
+        return cls.tables[key]
+
+    # H - Href in eV, S in eV/K and Cp in eV/K at the given temperatures, with coefficients A, ..., G as arrays
+    @staticmethod
+    def shomate(temperature, coefficients, thermodynamics):
+        A, B, C, D, E, F, G = coefficients
+        t = temperature/1000.0
+        H_kJmol = A*t + B*t**2/2.0 + C*t**3/3.0 + D*t**4/4.0 - E/t + F
+        S_JmolK = A*np.log(t) + B*t + C*t**2/2.0 + D*t**3/3.0 - E/2.0/t**2 + G
+        Cp_JmolK = A + B*t + C*t**2 + D*t**3 + E/t**2
+
+        return (H_kJmol*thermodynamics.kJmol_to_eV, S_JmolK*thermodynamics.JmolK_to_eVK,
+                Cp_JmolK*thermodynamics.JmolK_to_eVK)
+
+    # Coefficients of the cubic c0 + c1*u + c2*u**2 + c3*u**3 on u in [0, 1] that goes from p0 to p1 with the
+    # derivatives (with respect to u) m0 and m1, as a (4, number of cells) array
+    @staticmethod
+    def hermite(p0, p1, m0, m1):
+        return np.array([p0, m0, 3.0*(p1 - p0) - 2.0*m0 - m1, 2.0*(p0 - p1) + m0 + m1])
+
+    # The cell of each temperature and the position in it, u in [0, 1]. A temperature on a boundary is in
+    # the cell below it, so it uses the coefficients of the lower range, as in the Shomate equations
+    def locate(self, temperature):
+        x = (np.asarray(temperature, dtype=float) - self.lower)/self.step
+        # The cell of NaN is not a valid index, but evaluate() takes with mode='clip' and u stays NaN
+        with np.errstate(invalid='ignore'):
+            cell = np.clip(np.ceil(x) - 1.0, 0, self.number_of_cells - 1).astype(np.intp)
+
+        return cell, np.clip(x - cell, 0.0, 1.0)
+
+    @staticmethod
+    def evaluate(cells, cell, u):
+        # One take per coefficient is several times faster than indexing the (4, number of cells) array
+        c0, c1, c2, c3 = [coefficients.take(cell, mode='clip') for coefficients in cells]
+        return c0 + u*(c1 + u*(c2 + u*c3))
+
+    def entropy(self, temperature):
+        return self.evaluate(self.entropy_cells, *self.locate(temperature))
+
+    def enthalpy_minusRef(self, temperature):
+        return self.evaluate(self.enthalpy_cells, *self.locate(temperature))
+
+    # Cells of the chemical potential minus Href at the pressure given by log_pressure_term = kB*ln(p/p0):
+    # the nodes g and their slopes dg/dT, the cells of g(T) and, if g is continuous and decreasing, the cells
+    # of T(g) and the index of the cells by g (None otherwise)
+    def get_pressure(self, log_pressure_term):
+        pressure = self.pressures.get(log_pressure_term)
+        if pressure is not None:
+            return pressure
+
+        (H0, S0, Cp0), (H1, S1, Cp1) = self.ends
+        g0, g1 = H0 - self.left*(S0 - log_pressure_term), H1 - self.right*(S1 - log_pressure_term)
+        slope0, slope1 = log_pressure_term - S0, log_pressure_term - S1
+        nodes, slopes = np.append(g0, g1[-1]), np.append(slope0, slope1[-1])
+        pressure = {'nodes': nodes, 'slopes': slopes, 'inverse': None,
+                    'cells': self.hermite(g0, g1, slope0*self.step, slope1*self.step)}
+
+        widths = np.diff(nodes)
+        continuous = np.abs(g1[:-1] - g0[1:]).max(initial=0.0) <= self.max_error
+        if continuous and np.all(slope0 < 0.0) and np.all(slope1 < 0.0) and np.all(widths < 0.0):
+            # Each bucket of the index is at most a quarter of the narrowest cell, so it overlaps two cells at
+            # most; first[b] is the first cell that reaches below the top of bucket b
+            buckets = int(4.0*(nodes[0] - nodes[-1])/np.min(-widths)) + 1
+            if buckets <= 10**6:
+                width = (nodes[0] - nodes[-1])/buckets
+                tops = nodes[-1] + width*np.arange(1, buckets + 1)
+                first = np.minimum(np.searchsorted(-nodes[1:], -tops, side='right'), self.number_of_cells - 1)
+                pressure['inverse'] = {
+                    'cells': self.hermite(self.left, self.right, widths/slope0, widths/slope1),
+                    'reciprocal_widths': 1.0/widths, 'first': first, 'bucket_width': width}
+
+        if len(self.pressures) >= self.max_pressures:
+            self.pressures.clear()
+        self.pressures[log_pressure_term] = pressure
+
+        return pressure
+
+    def is_invertible(self, log_pressure_term):
+        return self.get_pressure(log_pressure_term)['inverse'] is not None
+
+    # H - Href - T*(S - kB*ln(p/p0)) in eV, i.e. the chemical potential of the molecule minus Href
+    def chemical_potential(self, temperature, log_pressure_term):
+        pressure = self.get_pressure(log_pressure_term)
+        temperature = np.asarray(temperature, dtype=float)
+        g = self.evaluate(pressure['cells'], *self.locate(temperature))
+
+        # Outside the Shomate ranges, H and S are constant, so g is linear in T
+        nodes, slopes = pressure['nodes'], pressure['slopes']
+        upper = self.lower + self.number_of_cells*self.step
+        if np.any(temperature < self.lower) or np.any(temperature > upper):
+            g = np.where(temperature < self.lower, nodes[0] + (temperature - self.lower)*slopes[0], g)
+            g = np.where(temperature > upper, nodes[-1] + (temperature - upper)*slopes[-1], g)
+
+        return g
+
+    # Inverse of chemical_potential(): the temperatures in K at which it equals g, clamped at 0 K. NaN stays NaN.
+    # Only for pressures where is_invertible()
+    def temperature(self, g, log_pressure_term):
+        pressure = self.get_pressure(log_pressure_term)
+        inverse = pressure['inverse']
+        nodes, slopes = pressure['nodes'], pressure['slopes']
+        g = np.asarray(g, dtype=float)
+
+        bucket = np.clip((g - nodes[-1])/inverse['bucket_width'], 0, len(inverse['first']) - 1)
+        with np.errstate(invalid='ignore'):
+            cell = inverse['first'].take(bucket.astype(np.intp), mode='clip')
+        cell = np.minimum(cell + (g <= nodes.take(cell + 1)), self.number_of_cells - 1)
+        temperature = self.evaluate(inverse['cells'], cell,
+                                    (g - nodes.take(cell))*inverse['reciprocal_widths'].take(cell))
+
+        upper = self.lower + self.number_of_cells*self.step
+        if np.any(g > nodes[0]) or np.any(g < nodes[-1]):
+            temperature = np.where(g > nodes[0], self.lower + (g - nodes[0])/slopes[0], temperature)
+            temperature = np.where(g < nodes[-1], upper + (g - nodes[-1])/slopes[-1], temperature)
+
+        return np.maximum(temperature, 0.0)
+
+
 # if __name__ == "__main__":
 #     mu = Thermodynamics()
 #     print('temperature_to_mu: ', mu.print_mu_corresponding_to_temperature_equals(1623))